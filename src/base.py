@@ -14,6 +14,7 @@
 # limitations under the License.
 """Base interface that all RAG examples should implement."""
 
+import asyncio
 from abc import ABC
 from abc import abstractmethod
 from typing import Generator
@@ -59,6 +60,30 @@ class BaseExample(ABC):
 
         pass
 
+    async def llm_chain_async(self, query: str, chat_history: List[Dict[str, Any]], **kwargs):
+        """Run `llm_chain` without blocking the event loop.
+
+        The chain setup, and any blocking model calls it makes before returning its generator,
+        run in a worker thread so the server keeps serving other requests meanwhile.
+
+        Returns:
+            The return value of `llm_chain`.
+        """
+
+        return await asyncio.to_thread(self.llm_chain, query, chat_history, **kwargs)
+
+    async def rag_chain_async(self, query: str, chat_history: List[Dict[str, Any]], **kwargs):
+        """Run `rag_chain` without blocking the event loop.
+
+        Retrieval, reranking and any blocking model calls made before the generator is returned
+        run in a worker thread so the server keeps serving other requests meanwhile.
+
+        Returns:
+            The return value of `rag_chain`.
+        """
+
+        return await asyncio.to_thread(self.rag_chain, query, chat_history, **kwargs)
+
     @abstractmethod
     def ingest_docs(self, data_dir: str, filename: str) -> None:
         """Defines how documents are ingested for processing by the RAG rag server example.
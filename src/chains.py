@@ -13,30 +13,38 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextvars
 import logging
 import os
 import requests
 import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from traceback import print_exc
 from typing import Any, Iterable, Dict, Generator, List, Optional, Tuple
-import json
 import re
+import orjson
 
 from .calculator import VGPUCalculator, VGPURequest
+from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from langchain_nvidia_ai_endpoints.callbacks import get_usage_callback
 from langchain_community.document_loaders import UnstructuredFileLoader
+from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain_core.prompts import MessagesPlaceholder
 from langchain_core.prompts.chat import ChatPromptTemplate
-from langchain_core.runnables import RunnableAssign
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.documents import Document
 from requests import ConnectTimeout
 from pydantic import BaseModel, Field
 
 from .base import BaseExample
 from .utils import create_vectorstore_langchain
+from .utils import embed_documents_in_batches
 from .utils import get_config
+from .utils import get_context_reranker
 from .utils import get_embedding_model
 from .utils import get_llm
 from .utils import get_prompts
@@ -45,8 +53,11 @@ from .utils import get_text_splitter
 from .utils import get_vectorstore
 from .utils import format_document_with_source
 from .utils import streaming_filter_think, get_streaming_filter_think_parser
-from .reflection import ReflectionCounter, check_context_relevance, check_response_groundedness
+from .reflection import ReflectionCounter, check_context_relevance, grounded_generate
 from .utils import normalize_relevance_scores
+from .semantic_cache import SemanticQueryCache
+from .embedding_cache import EmbeddingCache
+from .retriever_coalescer import BatchingQueryEmbedder, get_batching_retriever
 
 # Import enhanced components
 try:
@@ -149,12 +160,72 @@ def parse_vgpu_query(query: str) -> dict:
     
     return result
 
+# Defaults shared by every StructuredResponse. The parameters schema is assigned by
+# reference on each instantiation, so it must never be mutated.
+_DEFAULT_TITLE = "generate_vgpu_config"
+_DEFAULT_DESCRIPTION = "Generate the recommended vGPU configuration based on workload requirements and hardware specs."
+_DEFAULT_PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "vgpu_profile": {
+            "type": "string",
+            "description": "Exact NVIDIA vGPU profile name (must match one of the documented profiles) and must support at least gpu_memory_size GB of VRAM. ",
+            "enum": [
+                "L4-12Q, L4-24Q, L40S-24Q", "L40S-48Q", "L40-8Q", "L40-12Q", "L40-16Q",
+                "L40-24Q", "L40-48Q", "A40-8Q", "A40-12Q", "A40-16Q",
+                "A40-24Q", "A40-48Q", "L4-12Q", "L4-24Q", "DC-12Q",
+                "DC-24Q", "DC-32Q", "DC-48Q", "DC-96Q"
+            ]
+        },
+        "vcpu_count": {
+            "type": "integer",
+            "description": "Refer to the sizing guide if the workload is heavy, light, or moderate - take the cpu count here and multiply it by the concurrent users.",
+            "minimum": 1,
+            "maximum": 256
+        },
+        "gpu_memory_size": {
+            "type": "integer",
+            "description": "Total VRAM (in GB) needed = sum(model_params in billions) × precision_factor × 1.2 overhead × concurrent_users. Precision factor: INT8 = 1 byte, FP16 = 2 bytes, FP32 = 4 bytes.",
+            "minimum": 1,
+            "maximum": 256
+        },
+        "system_RAM": {
+            "type": "integer",  
+            "description": "System memory (in GB) allocated to this VM, including OS and framework overhead",
+            "minimum": 8,
+            "maximum": 2048
+        },
+        "max_kv_tokens": {
+            "type": ["integer", "null"],
+            "description": "Maximum KV cache tokens supported (leave null if not calculated)",
+            "minimum": 0,
+            "maximum": 1000000
+        },
+        "e2e_latency": {
+            "type": ["number", "null"],
+            "description": "End-to-end latency in seconds (leave null if not calculated)",
+            "minimum": 0
+        },
+        "time_to_first_token": {
+            "type": ["number", "null"],
+            "description": "Time to first token in seconds (leave null if not calculated)",
+            "minimum": 0
+        },
+        "throughput": {
+            "type": ["number", "null"],
+            "description": "Throughput in tokens per second (leave null if not calculated)",
+            "minimum": 0
+        }
+    },
+    "required": ["vgpu_profile", "vcpu_count", "gpu_memory_size", "system_RAM", "max_kv_tokens", "e2e_latency", "time_to_first_token", "throughput"],
+}
+
 # Structured Response Model for vGPU Configuration
 class StructuredResponse(BaseModel):
     """Structured response model for vGPU configuration recommendations."""
     
     title: str = Field(
-        default="generate_vgpu_config",
+        default=_DEFAULT_TITLE,
         description="Function title for vGPU configuration generation"
     )
     description: str = Field(
@@ -165,85 +236,140 @@ class StructuredResponse(BaseModel):
     )
 
     def __init__(self, **data):
-        # If parameters is not provided, create the default structure
+        # If parameters is not provided, use the default structure
         if 'parameters' not in data:
-            data['parameters'] = {
-                "type": "object",
-                "properties": {
-                    "vgpu_profile": {
-                        "type": "string",
-                        "description": "Exact NVIDIA vGPU profile name (must match one of the documented profiles) and must support at least gpu_memory_size GB of VRAM. ",
-                        "enum": [
-                            "L4-12Q, L4-24Q, L40S-24Q", "L40S-48Q", "L40-8Q", "L40-12Q", "L40-16Q",
-                            "L40-24Q", "L40-48Q", "A40-8Q", "A40-12Q", "A40-16Q",
-                            "A40-24Q", "A40-48Q", "L4-12Q", "L4-24Q", "DC-12Q",
-                            "DC-24Q", "DC-32Q", "DC-48Q", "DC-96Q"
-                        ]
-                    },
-                    "vcpu_count": {
-                        "type": "integer",
-                        "description": "Refer to the sizing guide if the workload is heavy, light, or moderate - take the cpu count here and multiply it by the concurrent users.",
-                        "minimum": 1,
-                        "maximum": 256
-                    },
-                    "gpu_memory_size": {
-                        "type": "integer",
-                        "description": "Total VRAM (in GB) needed = sum(model_params in billions) × precision_factor × 1.2 overhead × concurrent_users. Precision factor: INT8 = 1 byte, FP16 = 2 bytes, FP32 = 4 bytes.",
-                        "minimum": 1,
-                        "maximum": 256
-                    },
-                    "system_RAM": {
-                        "type": "integer",  
-                        "description": "System memory (in GB) allocated to this VM, including OS and framework overhead",
-                        "minimum": 8,
-                        "maximum": 2048
-                    },
-                    "max_kv_tokens": {
-                        "type": ["integer", "null"],
-                        "description": "Maximum KV cache tokens supported (leave null if not calculated)",
-                        "minimum": 0,
-                        "maximum": 1000000
-                    },
-                    "e2e_latency": {
-                        "type": ["number", "null"],
-                        "description": "End-to-end latency in seconds (leave null if not calculated)",
-                        "minimum": 0
-                    },
-                    "time_to_first_token": {
-                        "type": ["number", "null"],
-                        "description": "Time to first token in seconds (leave null if not calculated)",
-                        "minimum": 0
-                    },
-                    "throughput": {
-                        "type": ["number", "null"],
-                        "description": "Throughput in tokens per second (leave null if not calculated)",
-                        "minimum": 0
-                    }
-                },
-                "required": ["vgpu_profile", "vcpu_count", "gpu_memory_size", "system_RAM", "max_kv_tokens", "e2e_latency", "time_to_first_token", "throughput"],
-            }
+            data['parameters'] = _DEFAULT_PARAMETERS
         
         # Set default title if not provided
         if 'title' not in data:
-            data['title'] = "generate_vgpu_config"
+            data['title'] = _DEFAULT_TITLE
             
         # Set default description if not provided
         if 'description' not in data:
-            data['description'] = "Generate the recommended vGPU configuration based on workload requirements and hardware specs."
+            data['description'] = _DEFAULT_DESCRIPTION
             
         super().__init__(**data)
 
+# Static error responses, serialized once instead of on every failed request
+_ERROR_PAYLOADS = {
+    "connect_timeout": StructuredResponse(
+        description="Connection timed out while making a request to the NIM endpoint. Verify if the NIM server is available."
+    ).model_dump_json(),
+    "forbidden": StructuredResponse(
+        description="Authentication or permission error: Verify the validity and permissions of your NVIDIA API key."
+    ).model_dump_json(),
+    "not_found": StructuredResponse(
+        description="Please verify the API endpoint and your payload. Ensure that the model name is valid."
+    ).model_dump_json(),
+    "connection_error": StructuredResponse(
+        description="Connection error: Failed to connect to service. Please verify if all required services are running and accessible."
+    ).model_dump_json(),
+    "nim_connection_error": StructuredResponse(
+        description="Connection error: Failed to connect to service. Please verify if all required NIMs are running and accessible."
+    ).model_dump_json(),
+}
+
+# _ERROR_PAYLOADS responses for the HTTP status of a failed model client request
+_ERROR_KEYS_BY_STATUS = {401: "forbidden", 403: "forbidden", 404: "not_found"}
+
+def _error_status(e: BaseException) -> Optional[int]:
+    """HTTP status of the response which caused `e`, if the client recorded one.
+
+    OpenAI client errors carry a `status_code`, and requests errors carry their `response`.
+    The NVIDIA AI endpoints client re-raises requests errors as a plain Exception, keeping the
+    original error as its context.
+    """
+    for err in (e, e.__cause__, e.__context__):
+        if err is None:
+            continue
+        status = getattr(err, "status_code", None)
+        if status is None:
+            status = getattr(getattr(err, "response", None), "status_code", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+def _classify_error(e: BaseException) -> Optional[str]:
+    """Key of the _ERROR_PAYLOADS response for an authentication or not found error, None for other errors."""
+    status = _error_status(e)
+    if status is not None:
+        return _ERROR_KEYS_BY_STATUS.get(status)
+    # Fall back on the message for clients which do not keep the response around
+    message = str(e)
+    if "[403] Forbidden" in message and "Invalid UAM response" in message:
+        return "forbidden"
+    if "[404] Not Found" in message:
+        return "not_found"
+    return None
+
 logger = logging.getLogger(__name__)
 VECTOR_STORE_PATH = "vectorstore.pkl"
 TEXT_SPLITTER = None
 settings = get_config()
 document_embedder = get_embedding_model(model=settings.embeddings.model_name, url=settings.embeddings.server_url)
 ranker = get_ranking_model(model=settings.ranking.model_name, url=settings.ranking.server_url, top_n=settings.retriever.top_k)
-query_rewriter_llm_config = {"temperature": 0.7, "top_p": 0.2, "max_tokens": 1024}
+# Rewrites are deterministic so they can be cached per query and conversation history
+query_rewriter_llm_config = {"temperature": 0.0, "top_p": 0.2, "max_tokens": 1024}
 logger.info("Query rewriter llm config: model name %s, url %s, config %s", settings.query_rewriter.model_name, settings.query_rewriter.server_url, query_rewriter_llm_config)
 query_rewriter_llm = get_llm(model=settings.query_rewriter.model_name, llm_endpoint=settings.query_rewriter.server_url, **query_rewriter_llm_config)
 prompts = get_prompts()
 vdb_top_k = int(os.environ.get("VECTOR_DB_TOPK", 40))
+ENABLE_MULTITURN = os.environ.get("ENABLE_MULTITURN", "false").lower() == "true"
+ENABLE_REFLECTION = os.environ.get("ENABLE_REFLECTION", "false").lower() == "true"
+ENABLE_NEMOTRON_THINKING = os.environ.get("ENABLE_NEMOTRON_THINKING", "false").lower() == "true"
+MAX_REFLECTION_LOOP = int(os.environ.get("MAX_REFLECTION_LOOP", 3))
+CONVERSATION_HISTORY_TURNS = int(os.environ.get("CONVERSATION_HISTORY", 15))
+# conversation is tuple so it should be multiple of two
+CONVERSATION_HISTORY_MESSAGES = CONVERSATION_HISTORY_TURNS * 2
+# Skip the reranker call when the vector search already returned no more than reranker_top_k documents.
+# The documents then keep their vector search order and carry no relevance score.
+SKIP_RERANK_WITHIN_TOP_N = os.environ.get("SKIP_RERANK_WITHIN_TOP_N", "false").lower() == "true"
+# Number of chunks per embedding request and number of embedding requests in flight during ingestion
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_MAX_WORKERS = int(os.environ.get("EMBED_MAX_WORKERS", 4))
+
+# Reuse the embeddings of previously ingested chunks from a local SQLite cache
+ENABLE_EMBEDDING_CACHE = os.environ.get("ENABLE_EMBEDDING_CACHE", "false").lower() == "true"
+embedding_cache = EmbeddingCache(
+    os.environ.get("EMBEDDING_CACHE_PATH", "/tmp-data/embedding_cache.sqlite"),
+    settings.embeddings.model_name,
+) if ENABLE_EMBEDDING_CACHE else None
+
+# Serve repeated or near-duplicate queries from an in-process cache instead of calling the LLM again
+ENABLE_SEMANTIC_CACHE = os.environ.get("ENABLE_SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", 300))
+# Embed the cache lookups of concurrent requests together, in micro-batches
+ENABLE_QUERY_EMBEDDING_BATCHING = os.environ.get("ENABLE_QUERY_EMBEDDING_BATCHING", "false").lower() == "true"
+QUERY_EMBEDDING_BATCH_FLUSH_MS = float(os.environ.get("QUERY_EMBEDDING_BATCH_FLUSH_MS", 10))
+QUERY_EMBEDDING_MAX_BATCH = int(os.environ.get("QUERY_EMBEDDING_MAX_BATCH", 32))
+cache_embedder = BatchingQueryEmbedder(
+    document_embedder,
+    flush_ms=QUERY_EMBEDDING_BATCH_FLUSH_MS,
+    max_batch=QUERY_EMBEDDING_MAX_BATCH,
+) if ENABLE_SEMANTIC_CACHE and ENABLE_QUERY_EMBEDDING_BATCHING else document_embedder
+query_cache = SemanticQueryCache(
+    cache_embedder,
+    similarity_threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL,
+) if ENABLE_SEMANTIC_CACHE else None
+# Rewritten retriever queries and the documents retrieved for them, for multiturn follow-ups
+retrieval_cache = SemanticQueryCache(
+    cache_embedder,
+    similarity_threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL,
+) if ENABLE_SEMANTIC_CACHE else None
+
+# Stream the description of structured responses as it is generated, ahead of the final JSON
+ENABLE_STRUCTURED_STREAMING = os.environ.get("ENABLE_STRUCTURED_STREAMING", "false").lower() == "true"
+
+# Coalesce concurrent retrievals against the same dense collection into batched searches
+ENABLE_RETRIEVER_BATCHING = os.environ.get("ENABLE_RETRIEVER_BATCHING", "false").lower() == "true"
+RETRIEVER_BATCH_FLUSH_MS = float(os.environ.get("RETRIEVER_BATCH_FLUSH_MS", 10))
+RETRIEVER_MAX_BATCH = int(os.environ.get("RETRIEVER_MAX_BATCH", 16))
+
+# Retrieve for the raw multiturn query while it is being rewritten, used if the rewrite leaves it unchanged
+ENABLE_SPECULATIVE_RETRIEVAL = os.environ.get("ENABLE_SPECULATIVE_RETRIEVAL", "false").lower() == "true"
 
 try:
     VECTOR_STORE = create_vectorstore_langchain(document_embedder=document_embedder)
@@ -254,6 +380,192 @@ except Exception as ex:
 # Get a StreamingFilterThinkParser based on configuration
 StreamingFilterThinkParser = get_streaming_filter_think_parser()
 
+# Executor used to overlap network bound retrieval with prompt construction
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("RETRIEVAL_MAX_WORKERS", 16)),
+                               thread_name_prefix="rag-retrieval")
+
+def _submit(fn, *args, **kwargs) -> Future:
+    """Run `fn` on the shared executor, carrying over the caller's context (e.g. tracing spans)."""
+    return _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+@lru_cache(maxsize=8)
+def _build_query_rewriter(query_rewriter_prompt: str):
+    """Compose the query rewriter pipeline for a rewriter system prompt, once per prompt."""
+    contextualize_q_prompt = ChatPromptTemplate.from_messages(
+        [("system", query_rewriter_prompt), MessagesPlaceholder("chat_history"), ("human", "{input}"),]
+    )
+    logger.debug("Query rewriter prompt: %s", contextualize_q_prompt)
+    return contextualize_q_prompt | query_rewriter_llm | StreamingFilterThinkParser | StrOutputParser()
+
+@lru_cache(maxsize=1024)
+def _rewrite_query(query_rewriter_prompt: str, query: str, conversation_history: Tuple[Tuple[str, str], ...]) -> str:
+    """Rewrite `query` into a standalone question given the conversation history, once per distinct input.
+
+    The rewriter runs with temperature 0, so repeated follow-ups and retries reuse the earlier rewrite.
+    """
+    q_prompt = _build_query_rewriter(query_rewriter_prompt)
+    return q_prompt.invoke({"input": query, "chat_history": list(conversation_history)}, config={'run_name':'query-rewriter'})
+
+def _is_empty_query(query: str) -> bool:
+    """Whether the rewritten query is empty once surrounding whitespace and quotes are stripped."""
+    return not query.strip().strip("\"'").strip()
+
+def _skip_reranking(documents: List[Document], reranker_top_k: int) -> bool:
+    """Whether reranking `documents` can be skipped because it cannot narrow them down any further."""
+    if not documents:
+        return True
+    return SKIP_RERANK_WITHIN_TOP_N and len(documents) <= reranker_top_k
+
+def _sync_cache_version(vs, collection_name: str, vdb_endpoint: str = "") -> None:
+    """Invalidate the semantic caches of `collection_name` once its entity count changes.
+
+    Documents are also ingested by the ingestor server, which cannot invalidate this process's
+    caches, so the count is read from Milvus before each lookup. Deleting and adding the same
+    number of entities between two lookups goes unnoticed until the entries expire.
+    """
+    if query_cache is None and retrieval_cache is None:
+        return
+    try:
+        version = vs.col.num_entities
+    except Exception as e:
+        logger.warning("Failed to read the entity count of collection %s: %s", collection_name, e)
+        return
+    for cache in (query_cache, retrieval_cache):
+        if cache is not None:
+            cache.sync_version(collection_name, version, vdb_endpoint=vdb_endpoint or "")
+
+def _retrieval_cache_scope(caller: str, top_k: int, reranker_top_k: int, **kwargs) -> str:
+    """Settings which change the rewritten query or the retrieved documents, scoping retrieval cache entries.
+
+    `caller` keeps the entries of the chains and of document search apart, as they build their
+    retriever queries from differently truncated conversations.
+    """
+    return "|".join(str(part) for part in (
+        caller,
+        kwargs.get("vdb_endpoint"),
+        kwargs.get("enable_query_rewriting"),
+        kwargs.get("enable_reranker"),
+        kwargs.get("embedding_model"),
+        kwargs.get("reranker_model"),
+        top_k,
+        reranker_top_k,
+    ))
+
+def _response_cache_scope(**kwargs) -> str:
+    """Settings which change the generated answer, scoping the semantic cache entries of llm_chain."""
+    return "|".join(str(part) for part in (
+        kwargs.get("model"),
+        kwargs.get("llm_endpoint"),
+        kwargs.get("temperature"),
+        kwargs.get("top_p"),
+        kwargs.get("max_tokens"),
+        kwargs.get("stop"),
+        kwargs.get("enable_guardrails"),
+    ))
+
+def _rag_response_cache_scope(vdb_top_k: int, reranker_top_k: int, **kwargs) -> str:
+    """Settings which change the retrieved context or the generated answer, scoping the semantic cache entries of rag_chain."""
+    return "|".join(str(part) for part in (
+        _response_cache_scope(**kwargs),
+        kwargs.get("vdb_endpoint"),
+        kwargs.get("enable_reranker"),
+        kwargs.get("embedding_model"),
+        kwargs.get("embedding_endpoint"),
+        kwargs.get("reranker_model"),
+        kwargs.get("reranker_endpoint"),
+        vdb_top_k,
+        reranker_top_k,
+    ))
+
+def _dump(obj: Any) -> str:
+    """Compact JSON serialization of chain responses sent to the client."""
+    return orjson.dumps(obj).decode("utf-8")
+
+def _stream_structured_result(chain, inputs: Dict[str, Any], config: Dict[str, Any]):
+    """Stream a structured output chain, yielding `{"delta": ...}` chunks of the description.
+
+    The structured output parser emits increasingly complete StructuredResponse objects as
+    tokens arrive; the newly generated part of the description is yielded as a JSON delta.
+    The last parsed response is returned to the caller (use with `yield from`).
+    """
+    structured_result = None
+    streamed = ""
+    for partial in chain.stream(inputs, config=config):
+        if partial is None:
+            continue
+        structured_result = partial
+        # Partial responses parsed before the description is generated carry the default one
+        if partial.description == _DEFAULT_DESCRIPTION:
+            continue
+        description = partial.description or ""
+        if description.startswith(streamed) and len(description) > len(streamed):
+            yield _dump({"delta": description[len(streamed):]})
+            streamed = description
+    return structured_result if structured_result is not None else StructuredResponse()
+
+def is_structured_delta(structured_data: Any) -> bool:
+    """Whether a parsed chain response chunk is a `{"delta": ...}` chunk of a streamed description."""
+    return isinstance(structured_data, dict) and set(structured_data) == {"delta"}
+
+def accumulate_structured_chunk(accumulated: str, structured_data: Any) -> Tuple[str, str]:
+    """Return the message content so far and the delta content for a parsed chain response chunk.
+
+    Description deltas are appended to the message. The final structured response, formatted
+    for display, replaces them, so the last message content is a parseable JSON document.
+    """
+    if is_structured_delta(structured_data):
+        return accumulated + structured_data["delta"], structured_data["delta"]
+    json_response = orjson.dumps(structured_data, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json_response, json_response
+
+@lru_cache(maxsize=256)
+def _make_prompt(message: Tuple[Tuple[str, str], ...]) -> ChatPromptTemplate:
+    """Build the chat prompt template for a sequence of (role, content) messages, once per sequence.
+
+    The system prompt carries the nemotron thinking mode, so it is part of the key.
+    """
+    return ChatPromptTemplate.from_messages(list(message))
+
+_STRUCTURED_RESPONSE_SCHEMA = StructuredResponse.model_json_schema()
+_structured_response_parser = PydanticOutputParser(pydantic_object=StructuredResponse)
+
+_STRUCTURED_LLM_CACHE_SIZE = 128
+_structured_llm_cache: "OrderedDict[int, Tuple[Any, Any]]" = OrderedDict()
+_structured_llm_lock = threading.Lock()
+
+def _build_structured_llm(llm):
+    """Constrain `llm` to the StructuredResponse schema and parse its output into StructuredResponse.
+
+    NIM (vLLM) endpoints enforce the schema while sampling through `guided_json`, so the schema
+    is sent as-is rather than going through `with_structured_output`, which queries the model
+    listing to check for structured output support first. The parser also yields partial
+    responses while streaming. Other clients, such as the guardrails ChatOpenAI client, keep
+    using `with_structured_output`.
+    """
+    if isinstance(llm, ChatNVIDIA):
+        return llm.bind(nvext={"guided_json": _STRUCTURED_RESPONSE_SCHEMA}) | _structured_response_parser
+    return llm.with_structured_output(StructuredResponse)
+
+def _get_structured_llm(llm):
+    """Return the StructuredResponse output wrapper of `llm`, building it once per LLM client.
+
+    get_llm caches its clients, so the client identity is a stable key; the client is kept
+    alongside the wrapper so its id cannot be reused while cached.
+    """
+    key = id(llm)
+    with _structured_llm_lock:
+        cached = _structured_llm_cache.get(key)
+        if cached is not None and cached[0] is llm:
+            _structured_llm_cache.move_to_end(key)
+            return cached[1]
+
+    structured_llm = _build_structured_llm(llm)
+    with _structured_llm_lock:
+        _structured_llm_cache[key] = (llm, structured_llm)
+        while len(_structured_llm_cache) > _STRUCTURED_LLM_CACHE_SIZE:
+            _structured_llm_cache.popitem(last=False)
+    return structured_llm
+
 class APIError(Exception):
     """Custom exception class for API errors."""
     def __init__(self, message: str, code: int = 400):
@@ -307,11 +619,23 @@ class UnstructuredRAG(BaseExample):
                     TEXT_SPLITTER = get_text_splitter()
 
                 # split documents based on configuration provided
-                logger.info(f"Using text splitter instance: {TEXT_SPLITTER}")
+                logger.info("Using text splitter instance: %s", TEXT_SPLITTER)
                 documents = TEXT_SPLITTER.split_documents(raw_documents)
                 vs = get_vectorstore(document_embedder, collection_name, vdb_endpoint)
-                # ingest documents into vectorstore
-                vs.add_documents(documents)
+                # embed the chunks in batches and ingest them into vectorstore in a single call
+                texts = [d.page_content for d in documents]
+                metadatas = [d.metadata for d in documents]
+                if embedding_cache is not None:
+                    embeddings = embedding_cache.embed_documents(
+                        texts,
+                        lambda missing: embed_documents_in_batches(document_embedder, missing, EMBED_BATCH_SIZE, EMBED_MAX_WORKERS))
+                else:
+                    embeddings = embed_documents_in_batches(document_embedder, texts, EMBED_BATCH_SIZE, EMBED_MAX_WORKERS)
+                vs.add_embeddings(texts=texts, embeddings=embeddings, metadatas=metadatas)
+                if query_cache is not None:
+                    query_cache.invalidate(collection_name)
+                if retrieval_cache is not None:
+                    retrieval_cache.invalidate(collection_name)
             else:
                 logger.warning("No documents available to process!")
 
@@ -321,12 +645,13 @@ class UnstructuredRAG(BaseExample):
                 code=504
             ) from e
         except Exception as e:
-            if "[403] Forbidden" in str(e) and "Invalid UAM response" in str(e):
+            error_key = _classify_error(e)
+            if error_key == "forbidden":
                 raise APIError(
                     "Authentication or permission error: Verify NVIDIA API key validity and permissions.",
                     code=403
                 ) from e
-            if "[404] Not Found" in str(e):
+            if error_key == "not_found":
                 raise APIError(
                     "API endpoint or payload is invalid. Ensure the model name is valid.",
                     code=404
@@ -344,60 +669,66 @@ class UnstructuredRAG(BaseExample):
         """
         try:
             logger.info("Using llm to generate response directly without knowledge base.")
-            system_message = []
+            cache_history = [(message.role, message.content) for message in chat_history]
+            cache_scope = _response_cache_scope(**kwargs)
+            if query_cache is not None and query:
+                cached = query_cache.lookup(query, cache_scope, history=cache_history)
+                if cached is not None:
+                    logger.info("Serving llm chain response from semantic cache.")
+                    return iter([cached.payload])
+
             conversation_history = []
-            user_message = []
             nemotron_message = []
             system_prompt = ""
 
             system_prompt += prompts.get("chat_template", "")
 
             if "llama-3.3-nemotron-super-49b" in str(kwargs.get("model")):
-                if os.environ.get("ENABLE_NEMOTRON_THINKING", "false").lower() == "true":
+                if ENABLE_NEMOTRON_THINKING:
                     logger.info("Using nemotron thinking prompt")
                     system_prompt = "detailed thinking on"
                     # For chat mode, we don't have context, so use the chat template
-                    nemotron_message += [("user", prompts.get("chat_template", ""))]
+                    nemotron_message.append(("user", prompts.get("chat_template", "")))
                 else:
                     logger.info("Setting system prompt as detailed thinking off")
                     system_prompt = "detailed thinking off"
-                    nemotron_message += [("user", prompts.get("chat_template", ""))]
+                    nemotron_message.append(("user", prompts.get("chat_template", "")))
 
+            system_fragments = [system_prompt]
             for message in chat_history:
                 if message.role ==  "system":
-                    system_prompt = system_prompt + " " + message.content
+                    system_fragments.append(message.content)
                 else:
                     conversation_history.append((message.role, message.content))
-
-            system_message = [("system", system_prompt)]
+            system_prompt = " ".join(system_fragments)
 
             logger.info("Query is: %s", query)
-            if query is not None and query != "":
-                user_message += [("user", "{question}")]
-
             # Prompt template with system message, conversation history and user query
-            message = system_message + nemotron_message + conversation_history + user_message
+            message = [("system", system_prompt), *nemotron_message, *conversation_history]
+            if query is not None and query != "":
+                message.append(("user", "{question}"))
 
             self.print_conversation_history(message, query)
 
-            prompt_template = ChatPromptTemplate.from_messages(message)
+            prompt_template = _make_prompt(tuple(message))
             llm = get_llm(**kwargs)
 
             # Use structured output for consistent JSON responses
-            structured_llm = llm.with_structured_output(StructuredResponse)
+            structured_llm = _get_structured_llm(llm)
             chain = prompt_template | structured_llm
             
             # Stream the structured response as JSON
             def stream_structured_response():
                 try:
-                    structured_result = chain.invoke({"question": query}, config={'run_name':'llm-stream'})
-                    # Convert to JSON and yield as a single chunk
-                    json_response = json.dumps(structured_result.model_dump(), ensure_ascii=False, indent=2)
-                    logger.info("Structured LLM response generated: %s", json_response)
+                    if ENABLE_STRUCTURED_STREAMING:
+                        structured_result = yield from _stream_structured_result(
+                            chain, {"question": query}, {'run_name':'llm-stream'})
+                    else:
+                        structured_result = chain.invoke({"question": query}, config={'run_name':'llm-stream'})
+                    logger.info("Structured LLM response generated: %s", structured_result)
                     
-                    # Parse the response to extract values
-                    json_data = json.loads(json_response)
-                    params = json_data.get("parameters", {})
+                    # Read the values straight off the model, the corrected response below is the only one serialized
+                    params = structured_result.parameters or {}
                     
                     # Build properly structured parameters with correct field names
                     corrected_params = {
@@ -413,50 +744,44 @@ class UnstructuredRAG(BaseExample):
                     
                     # Build the final response with corrected field names
                     final_response = {
-                        "title": json_data.get("title", "generate_vgpu_config"),
-                        "description": json_data.get("description", ""),
+                        "title": structured_result.title or "generate_vgpu_config",
+                        "description": structured_result.description or "",
                         "parameters": corrected_params
                     }
                     
-                    json_response = json.dumps(final_response, ensure_ascii=False, indent=2)
+                    json_response = _dump(final_response)
                     logger.info("Final corrected LLM response: %s", json_response)
+                    if query_cache is not None and query:
+                        query_cache.insert(query, cache_scope, json_response, history=cache_history)
                     yield json_response
                 except Exception as e:
                     logger.error("Error in structured response: %s", e)
                     error_response = StructuredResponse(
                         description=f"Error generating vGPU configuration: {str(e)}. Unable to provide recommendation."
                     )
-                    yield json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)
+                    yield error_response.model_dump_json()
             
             return stream_structured_response()
         except ConnectTimeout as e:
             logger.warning("Connection timed out while making a request to the LLM endpoint: %s", e)
-            error_response = StructuredResponse(
-                description="Connection timed out while making a request to the NIM endpoint. Verify if the NIM server is available."
-            )
-            return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)])
+            return iter([_ERROR_PAYLOADS["connect_timeout"]])
 
         except Exception as e:
             logger.warning("Failed to generate response due to exception %s", e)
             print_exc()
 
-            if "[403] Forbidden" in str(e) and "Invalid UAM response" in str(e):
+            error_key = _classify_error(e)
+            if error_key == "forbidden":
                 logger.warning("Authentication or permission error: Verify the validity and permissions of your NVIDIA API key.")
-                error_response = StructuredResponse(
-                    description="Authentication or permission error: Verify the validity and permissions of your NVIDIA API key."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)])
-            elif "[404] Not Found" in str(e):
+                return iter([_ERROR_PAYLOADS["forbidden"]])
+            elif error_key == "not_found":
                 logger.warning("Please verify the API endpoint and your payload. Ensure that the model name is valid. Errror %s", e)
-                error_response = StructuredResponse(
-                    description="Please verify the API endpoint and your payload. Ensure that the model name is valid."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)])
+                return iter([_ERROR_PAYLOADS["not_found"]])
             else:
                 error_response = StructuredResponse(
                     description=f"Failed to generate LLM chain response. {str(e)}"
                 )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)])
+                return iter([error_response.model_dump_json()])
 
     def rag_chain(  # pylint: disable=arguments-differ
             self,
@@ -477,7 +802,7 @@ class UnstructuredRAG(BaseExample):
             kwargs: ?
         """
 
-        if os.environ.get("ENABLE_MULTITURN", "false").lower() == "true":
+        if ENABLE_MULTITURN:
             return self.rag_chain_with_multiturn(query=query, chat_history=chat_history, reranker_top_k=reranker_top_k, vdb_top_k=vdb_top_k, collection_name=collection_name, **kwargs)
         
         # Determine if enhanced mode should be used
@@ -490,47 +815,79 @@ class UnstructuredRAG(BaseExample):
             if vs is None:
                 raise APIError("Vector store not initialized properly. Please check if the vector DB is up and running.", 500)
 
+            cache_history = [(message.role, message.content) for message in chat_history]
+            cache_scope = _rag_response_cache_scope(vdb_top_k, reranker_top_k, **kwargs)
+            if query_cache is not None:
+                _sync_cache_version(vs, collection_name, kwargs.get("vdb_endpoint"))
+                cached = query_cache.lookup(query, cache_scope, collection_name=collection_name, history=cache_history)
+                if cached is not None:
+                    logger.info("Serving rag chain response from semantic cache.")
+                    return iter([cached.payload]), cached.context
+
             llm = get_llm(**kwargs)
             ranker = get_ranking_model(model=kwargs.get("reranker_model"), url=kwargs.get("reranker_endpoint"), top_n=reranker_top_k)
             top_k = vdb_top_k if ranker and kwargs.get("enable_reranker") else reranker_top_k
             logger.info("Setting retriever top k as: %s.", top_k)
             retriever = vs.as_retriever(search_kwargs={"k": top_k})  # milvus does not support similarily threshold
+            if ENABLE_RETRIEVER_BATCHING:
+                coalescer = get_batching_retriever(
+                    (collection_name, kwargs.get("vdb_endpoint"), kwargs.get("embedding_model"), kwargs.get("embedding_endpoint")),
+                    vs,
+                    document_embedder,
+                    flush_ms=RETRIEVER_BATCH_FLUSH_MS,
+                    max_batch=RETRIEVER_MAX_BATCH)
+                if coalescer is not None:
+                    retriever = coalescer.as_retriever(k=top_k)
+
+            # Start retrieval right away so it overlaps with the prompt construction below.
+            # With reflection enabled retrieval is driven by the relevance check loop instead.
+            retrieval = None
+            normalize_scores = False
+            if not use_enhanced and not ENABLE_REFLECTION:
+                retrieval = _submit(self._retrieve_context,
+                                    retriever,
+                                    ranker if kwargs.get("enable_reranker") else None,
+                                    query,
+                                    top_k,
+                                    reranker_top_k,
+                                    normalize=False)
 
             system_prompt = ""
-            conversation_history = []
             system_prompt += prompts.get("rag_template", "")
             user_message = []
 
             if "llama-3.3-nemotron-super-49b" in str(kwargs.get("model")):
-                if os.environ.get("ENABLE_NEMOTRON_THINKING", "false").lower() == "true":
+                if ENABLE_NEMOTRON_THINKING:
                     logger.info("Using nemotron thinking prompt for RAG")
                     system_prompt = "detailed thinking on"
                     # Use the nemotron_thinking_prompt instead of rag_template
-                    user_message += [("user", prompts.get("nemotron_thinking_prompt", prompts.get("rag_template", "")))]
+                    user_message.append(("user", prompts.get("nemotron_thinking_prompt", prompts.get("rag_template", ""))))
                 else:
                     logger.info("Setting system prompt as detailed thinking off")
                     system_prompt = "detailed thinking off"
-                    user_message += [("user", prompts.get("rag_template", ""))]
+                    user_message.append(("user", prompts.get("rag_template", "")))
 
-            for message in chat_history:
-                if message.role ==  "system":
-                    system_prompt = system_prompt + " " + message.content
+            system_prompt = " ".join([system_prompt, *(message.content for message in chat_history if message.role == "system")])
 
-            system_message = [("system", system_prompt)]
-            user_message += [("user", "{question}")]
+            user_message.append(("user", "{question}"))
 
-            # Prompt template with system message, conversation history and user query
-            message = system_message + conversation_history + user_message
+            # Prompt template with system message and user query
+            message = [("system", system_prompt), *user_message]
             self.print_conversation_history(message)
-            prompt = ChatPromptTemplate.from_messages(message)
+            prompt = _make_prompt(tuple(message))
+
+            # Use structured output for consistent JSON responses
+            structured_llm = _get_structured_llm(llm)
+            chain = prompt | structured_llm
+
             # Retrieve documents based on mode
             if use_enhanced and self.document_aggregator:
               pass    
             else:
                 # Standard mode: use original retrieval logic
                 # Get relevant documents with optional reflection
-                if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true":
-                    max_loops = int(os.environ.get("MAX_REFLECTION_LOOP", 3))
+                if ENABLE_REFLECTION:
+                    max_loops = MAX_REFLECTION_LOOP
                     reflection_counter = ReflectionCounter(max_loops)
 
                     context_to_show, is_relevant = check_context_relevance(
@@ -543,78 +900,40 @@ class UnstructuredRAG(BaseExample):
                     if not is_relevant:
                         logger.warning("Could not find sufficiently relevant context after maximum attempts")
                 else:
-                    if ranker and kwargs.get("enable_reranker"):
-                        logger.info(
-                            "Narrowing the collection from %s results and further narrowing it to "
-                            "%s with the reranker for rag chain.",
-                            top_k,
-                            reranker_top_k)
-                        logger.info("Setting ranker top n as: %s.", reranker_top_k)
-                        context_reranker = RunnableAssign({
-                            "context":
-                                lambda input: ranker.compress_documents(query=input['question'], documents=input['context'])
-                        })
-                        # Create a chain with retriever and reranker
-                        retriever = {"context": retriever} | RunnableAssign({"context": lambda input: input["context"]})
-                        docs = retriever.invoke(query, config={'run_name':'retriever'})
-                        docs = context_reranker.invoke({"context": docs.get("context", []), "question": query}, config={'run_name':'context_reranker'})
-                        context_to_show = docs.get("context", [])
-                        # Normalize scores to 0-1 range
-                        context_to_show = normalize_relevance_scores(context_to_show)
-                        # Remove metadata from context
-                        logger.debug("Document Retrieved: %s", docs)
-                    else:
-                        context_to_show = retriever.invoke(query)
-                docs = [format_document_with_source(d) for d in context_to_show]
-            
-            # Use structured output for consistent JSON responses
-            structured_llm = llm.with_structured_output(StructuredResponse)
-            chain = prompt | structured_llm
-
-            # Check response groundedness if we still have reflection iterations available
-            if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true" and reflection_counter.remaining > 0:
-                initial_response = chain.invoke({"question": query, "context": docs})
-                final_description, is_grounded = check_response_groundedness(
-                    initial_response.description,
-                    docs,
-                    reflection_counter
-                )
-                
-                if is_grounded:
-                    # If the initial response was grounded, use it as-is
-                    structured_final = initial_response
+                    context_to_show = retrieval.result()
+                    # Reranker scores are normalized to the 0-1 range while formatting the documents
+                    normalize_scores = bool(ranker and kwargs.get("enable_reranker"))
+                if normalize_scores:
+                    docs = normalize_relevance_scores(context_to_show, format_fn=format_document_with_source)
                 else:
-                    # If reflection improved the description, re-run the chain with enhanced prompt
-                    logger.info("Re-running structured chain with grounded description from reflection")
-                    
-                    # Create an enhanced prompt that includes the grounded description
-                    enhanced_query = f"""Original query: {query}
-
-Based on the context documents, here is a grounded analysis:
-{final_description}
+                    docs = [format_document_with_source(d) for d in context_to_show]
 
-Now provide a complete structured vGPU configuration based on this grounded analysis."""
-                    
-                    # Re-invoke the chain with the enhanced query
-                    structured_final = chain.invoke({"question": enhanced_query, "context": docs})
-                    
-                    # Log for debugging
-                    logger.info(f"Final structured response after reflection: {structured_final.description[:200]}...")
+            # Check response groundedness if we still have reflection iterations available
+            if ENABLE_REFLECTION and reflection_counter.remaining > 0:
+                structured_final, is_grounded = grounded_generate(chain, query, docs, reflection_counter)
+                if not is_grounded:
+                    logger.warning("Could not generate a sufficiently grounded response after maximum attempts")
                 
-                return iter([json.dumps(structured_final.model_dump(), ensure_ascii=False, indent=2)]), context_to_show
+                json_response = structured_final.model_dump_json()
+                if query_cache is not None:
+                    query_cache.insert(query, cache_scope, json_response, context=context_to_show,
+                                       collection_name=collection_name, history=cache_history)
+                return iter([json_response]), context_to_show
             else:
                 def stream_structured_rag_response():
                     try:
                         logger.info("Here is the query: %s", query)
 
 
-                        structured_result = chain.invoke({"question": query, "context": docs}, config={'run_name':'llm-stream'})
-                        json_response = json.dumps(structured_result.model_dump(), ensure_ascii=False, indent=2)
-                        logger.info("Structured RAG response generated successfully: %s", json_response)
+                        if ENABLE_STRUCTURED_STREAMING:
+                            structured_result = yield from _stream_structured_result(
+                                chain, {"question": query, "context": docs}, {'run_name':'llm-stream'})
+                        else:
+                            structured_result = chain.invoke({"question": query, "context": docs}, config={'run_name':'llm-stream'})
+                        logger.info("Structured RAG response generated successfully: %s", structured_result)
                         
-                        # Parse the response to extract values
-                        json_data = json.loads(json_response)
-                        params = json_data.get("parameters", {})
+                        # Read the values straight off the model, the corrected response below is the only one serialized
+                        params = structured_result.parameters or {}
                         
                         # Extract GPU info and model info from wherever the LLM put it
                         gpu_model = params.get("gpu_model") or params.get("vgpu_profile", "").split('-')[0]
@@ -739,57 +1058,49 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                         
                         # Build the final response with corrected field names
                         final_response = {
-                            "title": json_data.get("title", "generate_vgpu_config"),
-                            "description": json_data.get("description", ""),
+                            "title": structured_result.title or "generate_vgpu_config",
+                            "description": structured_result.description or "",
                             "parameters": corrected_params
                         }
                         
-                        json_response = json.dumps(final_response, ensure_ascii=False, indent=2)
+                        json_response = _dump(final_response)
                         logger.info("Final corrected response: %s", json_response)
+                        if query_cache is not None:
+                            query_cache.insert(query, cache_scope, json_response, context=context_to_show,
+                                               collection_name=collection_name, history=cache_history)
                         yield json_response
                     except Exception as e:
                         logger.error("Error in structured RAG response: %s", e)
                         error_response = StructuredResponse(
                             description=f"Error generating RAG vGPU configuration: {str(e)}. Unable to provide recommendation."
                         )
-                        yield json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)
+                        yield error_response.model_dump_json()
                 
                 return stream_structured_rag_response(), context_to_show
         except ConnectTimeout as e:
             logger.warning("Connection timed out while making a request to the LLM endpoint: %s", e)
-            error_response = StructuredResponse(
-                description="Connection timed out while making a request to the NIM endpoint. Verify if the NIM server is available."
-            )
-            return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+            return iter([_ERROR_PAYLOADS["connect_timeout"]]), []
 
         except requests.exceptions.ConnectionError as e:
             if "HTTPConnectionPool" in str(e):
                 logger.warning("Connection pool error while connecting to service: %s", e)
-                error_response = StructuredResponse(
-                    description="Connection error: Failed to connect to service. Please verify if all required services are running and accessible."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+                return iter([_ERROR_PAYLOADS["connection_error"]]), []
         except Exception as e:
             logger.warning("Failed to generate response due to exception %s", e)
             print_exc()
 
-            if "[403] Forbidden" in str(e) and "Invalid UAM response" in str(e):
+            error_key = _classify_error(e)
+            if error_key == "forbidden":
                 logger.warning("Authentication or permission error: Verify the validity and permissions of your NVIDIA API key.")
-                error_response = StructuredResponse(
-                    description="Authentication or permission error: Verify the validity and permissions of your NVIDIA API key."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
-            elif "[404] Not Found" in str(e):
+                return iter([_ERROR_PAYLOADS["forbidden"]]), []
+            elif error_key == "not_found":
                 logger.warning("Please verify the API endpoint and your payload. Ensure that the model name is valid.")
-                error_response = StructuredResponse(
-                    description="Please verify the API endpoint and your payload. Ensure that the model name is valid."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+                return iter([_ERROR_PAYLOADS["not_found"]]), []
             else:
                 error_response = StructuredResponse(
                     description=f"Failed to generate RAG chain response. {str(e)}"
                 )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+                return iter([error_response.model_dump_json()]), []
 
 
     def rag_chain_with_multiturn(self,
@@ -818,35 +1129,48 @@ Now provide a complete structured vGPU configuration based on this grounded anal
             logger.info("Setting retriever top k as: %s.", top_k)
             retriever = vs.as_retriever(search_kwargs={"k": top_k})  # milvus does not support similarily threshold
 
-            # conversation is tuple so it should be multiple of two
-            # -1 is to keep last k conversation
-            history_count = int(os.environ.get("CONVERSATION_HISTORY", 15)) * 2 * -1
-            chat_history = chat_history[history_count:]
+            # keep last k conversation, only copying the history when it is longer than that
+            if len(chat_history) > CONVERSATION_HISTORY_MESSAGES:
+                chat_history = chat_history[-CONVERSATION_HISTORY_MESSAGES:]
             system_prompt = ""
             conversation_history = []
             system_prompt += prompts.get("rag_template", "")
             user_message = []
 
             if "llama-3.3-nemotron-super-49b" in str(kwargs.get("model")):
-                if os.environ.get("ENABLE_NEMOTRON_THINKING", "false").lower() == "true":
+                if ENABLE_NEMOTRON_THINKING:
                     logger.info("Using nemotron thinking prompt for multiturn RAG")
                     system_prompt = "detailed thinking on"
                     # Use the nemotron_thinking_prompt instead of rag_template
-                    user_message += [("user", prompts.get("nemotron_thinking_prompt", prompts.get("rag_template", "")))]
+                    user_message.append(("user", prompts.get("nemotron_thinking_prompt", prompts.get("rag_template", ""))))
                 else:
                     logger.info("Setting system prompt as detailed thinking off")
                     system_prompt = "detailed thinking off"
-                    user_message += [("user", prompts.get("rag_template", ""))]
+                    user_message.append(("user", prompts.get("rag_template", "")))
 
+            system_fragments = [system_prompt]
             for message in chat_history:
                 if message.role ==  "system":
-                    system_prompt = system_prompt + " " + message.content
+                    system_fragments.append(message.content)
                 else:
                     conversation_history.append((message.role, message.content))
-
-            system_message = [("system", system_prompt)]
-            retriever_query = query
-            if chat_history:
+            system_prompt = " ".join(system_fragments)
+
+            # Similar follow-ups to the same conversation reuse the rewritten query and documents
+            # retrieved for an earlier one. The retriever query is built from the whole conversation,
+            # so it scopes the entries exactly and only the latest question is compared.
+            cached_retrieval = None
+            if retrieval_cache is not None and not ENABLE_REFLECTION:
+                _sync_cache_version(vs, collection_name, kwargs.get("vdb_endpoint"))
+                retrieval_key = query
+                retrieval_scope = _retrieval_cache_scope("multiturn", top_k, reranker_top_k, **kwargs)
+                retrieval_history = [(message.role, message.content) for message in chat_history]
+                cached_retrieval = retrieval_cache.lookup(retrieval_key, retrieval_scope, collection_name=collection_name,
+                                                          history=retrieval_history)
+
+            retriever_query = query if cached_retrieval is None else cached_retrieval.payload
+            speculative_retrieval = None
+            if chat_history and cached_retrieval is None:
                 if kwargs.get("enable_query_rewriting"):
                     # Based on conversation history recreate query for better document retrieval
                     contextualize_q_system_prompt = (
@@ -857,33 +1181,51 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                         "just reformulate it if needed and otherwise return it as is."
                     )
                     query_rewriter_prompt = prompts.get("query_rewriter_prompt", contextualize_q_system_prompt)
-                    contextualize_q_prompt = ChatPromptTemplate.from_messages(
-                        [("system", query_rewriter_prompt), MessagesPlaceholder("chat_history"), ("human", "{input}"),]
-                    )
-                    q_prompt = contextualize_q_prompt | query_rewriter_llm | StreamingFilterThinkParser | StrOutputParser()
+                    if ENABLE_SPECULATIVE_RETRIEVAL and not ENABLE_REFLECTION:
+                        # Standalone questions are usually returned as is, overlap their retrieval with the rewrite
+                        speculative_retrieval = _submit(self._retrieve_context,
+                                                        retriever,
+                                                        ranker if kwargs.get("enable_reranker") else None,
+                                                        query,
+                                                        top_k,
+                                                        reranker_top_k)
                     # query to be used for document retrieval
-                    logger.info("Query rewriter prompt: %s", contextualize_q_prompt)
-                    retriever_query = q_prompt.invoke({"input": query, "chat_history": conversation_history}, config={'run_name':'query-rewriter'})
+                    retriever_query = _rewrite_query(query_rewriter_prompt, query, tuple(conversation_history))
                     logger.info("Rewritten Query: %s %s", retriever_query, len(retriever_query))
-                    if retriever_query.replace('"', "'") == "''" or len(retriever_query) == 0:
+                    if _is_empty_query(retriever_query):
+                        if speculative_retrieval is not None:
+                            speculative_retrieval.cancel()
                         return iter([""]), []
+                    if speculative_retrieval is not None and " ".join(retriever_query.lower().split()) != " ".join(query.lower().split()):
+                        logger.info("Discarding speculative retrieval, the query was rewritten")
+                        speculative_retrieval.cancel()
+                        speculative_retrieval = None
                 else:
                     # Use previous user queries and current query to form a single query for document retrieval
-                    user_queries = [msg.content for msg in chat_history if msg.role == "user"]
                     # TODO: Find a better way to join this when queries already have punctuation
-                    retriever_query = ". ".join([*user_queries, query])
+                    retriever_query = ". ".join([*(msg.content for msg in chat_history if msg.role == "user"), query])
                     logger.info("Combined retriever query: %s", retriever_query)
 
             # Prompt for response generation based on context
-            user_message += [("user", "{question}")]
-            message = system_message + conversation_history + user_message
+            user_message.append(("user", "{question}"))
+            message = [("system", system_prompt), *conversation_history, *user_message]
             self.print_conversation_history(message)
-            prompt = ChatPromptTemplate.from_messages(message)
+            prompt = _make_prompt(tuple(message))
             
             # Retrieve documents from our single vGPU knowledge base
             # Get relevant documents with optional reflection
-            if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true":
-                max_loops = int(os.environ.get("MAX_REFLECTION_LOOP", 3))
+            docs = None
+            if cached_retrieval is not None:
+                logger.info("Serving multiturn retrieval from semantic cache, retriever query: %s", retriever_query)
+                context_to_show = cached_retrieval.context
+            elif speculative_retrieval is not None:
+                context_to_show = speculative_retrieval.result()
+                if retrieval_cache is not None:
+                    retrieval_cache.insert(retrieval_key, retrieval_scope, retriever_query,
+                                           context=context_to_show, collection_name=collection_name,
+                                           history=retrieval_history)
+            elif ENABLE_REFLECTION:
+                max_loops = MAX_REFLECTION_LOOP
                 reflection_counter = ReflectionCounter(max_loops)
 
                 context_to_show, is_relevant = check_context_relevance(
@@ -904,80 +1246,60 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                         top_k,
                         settings.retriever.top_k)
                     logger.info("Setting ranker top n as: %s.", reranker_top_k)
-                    context_reranker = RunnableAssign({
-                        "context":
-                            lambda input: ranker.compress_documents(query=input['question'], documents=input['context'])
-                    })
-
-                    retriever = {"context": retriever} | RunnableAssign({"context": lambda input: input["context"]})
-                    docs = retriever.invoke(retriever_query, config={'run_name':'retriever'})
-                    docs = context_reranker.invoke({"context": docs.get("context", []), "question": retriever_query}, config={'run_name':'context_reranker'})
-                    context_to_show = docs.get("context", [])
-                    # Normalize scores to 0-1 range
-                    context_to_show = normalize_relevance_scores(context_to_show)
+                    context_to_show = retriever.invoke(retriever_query, config={'run_name':'retriever'})
+                    if _skip_reranking(context_to_show, reranker_top_k):
+                        logger.debug("Skipping reranker for %d retrieved documents", len(context_to_show))
+                    else:
+                        docs = get_context_reranker().invoke(
+                            {"context": context_to_show, "question": retriever_query, "ranker": ranker},
+                            config={'run_name':'context_reranker'})
+                        context_to_show = docs.get("context", [])
+                    # Normalize scores to 0-1 range, formatting the documents in the same pass
+                    docs = normalize_relevance_scores(context_to_show, format_fn=format_document_with_source)
                 else:
-                    docs = retriever.invoke(retriever_query, config={'run_name':'retriever'})
-                    context_to_show = docs
+                    context_to_show = retriever.invoke(retriever_query, config={'run_name':'retriever'})
+                if retrieval_cache is not None:
+                    retrieval_cache.insert(retrieval_key, retrieval_scope, retriever_query,
+                                           context=context_to_show, collection_name=collection_name,
+                                           history=retrieval_history)
 
             # Extract valid profiles and enhance context
             valid_profiles = self._extract_vgpu_profiles_from_context(context_to_show)
             enhanced_context = self._prepare_enhanced_context(retriever_query, context_to_show, valid_profiles)
             
-            # Format documents
-            docs = [format_document_with_source(d) for d in context_to_show]
+            # Format documents, unless they were formatted while normalizing their scores
+            if docs is None:
+                docs = [format_document_with_source(d) for d in context_to_show]
             
             # Add enhanced context to system prompt if available
             if enhanced_context:
                 system_prompt += "\n\n" + enhanced_context
-                system_message = [("system", system_prompt)]
-                message = system_message + conversation_history + user_message
-                prompt = ChatPromptTemplate.from_messages(message)
+                message = [("system", system_prompt), *conversation_history, *user_message]
+                prompt = _make_prompt(tuple(message))
             
             # Use structured output for consistent JSON responses
-            structured_llm = llm.with_structured_output(StructuredResponse)
+            structured_llm = _get_structured_llm(llm)
             chain = prompt | structured_llm
 
             # Check response groundedness if we still have reflection iterations available
-            if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true" and reflection_counter.remaining > 0:
-                initial_response = chain.invoke({"question": query, "context": docs})
-                final_description, is_grounded = check_response_groundedness(
-                    initial_response.description,
-                    docs,
-                    reflection_counter
-                )
+            if ENABLE_REFLECTION and reflection_counter.remaining > 0:
+                structured_final, is_grounded = grounded_generate(chain, query, docs, reflection_counter)
+                if not is_grounded:
+                    logger.warning("Could not generate a sufficiently grounded response after maximum attempts")
                 
-                if is_grounded:
-                    # If the initial response was grounded, use it as-is
-                    structured_final = initial_response
-                else:
-                    # If reflection improved the description, re-run the chain with enhanced prompt
-                    logger.info("Re-running structured chain with grounded description from reflection")
-                    
-                    # Create an enhanced prompt that includes the grounded description
-                    enhanced_query = f"""Original query: {query}
-
-Based on the context documents, here is a grounded analysis:
-{final_description}
-
-Now provide a complete structured vGPU configuration based on this grounded analysis."""
-                    
-                    # Re-invoke the chain with the enhanced query
-                    structured_final = chain.invoke({"question": enhanced_query, "context": docs})
-                    
-                    # Log for debugging
-                    logger.info(f"Final structured response after reflection: {structured_final.description[:200]}...")
-                
-                return iter([json.dumps(structured_final.model_dump(), ensure_ascii=False, indent=2)]), context_to_show
+                return iter([structured_final.model_dump_json()]), context_to_show
             else:
                 def stream_structured_multiturn_response():
                     try:
-                        structured_result = chain.invoke({"question": query, "context": docs}, config={'run_name':'llm-stream'})
-                        json_response = json.dumps(structured_result.model_dump(), ensure_ascii=False, indent=2)
-                        logger.info("Structured multiturn RAG response generated: %s", json_response)
+                        if ENABLE_STRUCTURED_STREAMING:
+                            structured_result = yield from _stream_structured_result(
+                                chain, {"question": query, "context": docs}, {'run_name':'llm-stream'})
+                        else:
+                            structured_result = chain.invoke({"question": query, "context": docs}, config={'run_name':'llm-stream'})
+                        logger.info("Structured multiturn RAG response generated: %s", structured_result)
                         
-                        # Parse the response to extract values
-                        json_data = json.loads(json_response)
-                        params = json_data.get("parameters", {})
+                        # Read the values straight off the model, the corrected response below is the only one serialized
+                        params = structured_result.parameters or {}
                         
                         # Extract GPU info and model info from wherever the LLM put it
                         gpu_model = params.get("gpu_model") or params.get("vgpu_profile", "").split('-')[0]
@@ -986,7 +1308,7 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                         
                         # Try to extract from description if not in parameters
                         if not model_name or not gpu_model:
-                            payload = parse_vgpu_query(json_data.get("description", ""))
+                            payload = parse_vgpu_query(structured_result.description or "")
                             model_name = model_name or payload.get("Model")
                             precision = precision or payload.get("Precision", "fp16").lower()
                             workload = payload.get("Workload", "RAG")
@@ -1033,12 +1355,12 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                         
                         # Build the final response with corrected field names
                         final_response = {
-                            "title": json_data.get("title", "generate_vgpu_config"),
-                            "description": json_data.get("description", ""),
+                            "title": structured_result.title or "generate_vgpu_config",
+                            "description": structured_result.description or "",
                             "parameters": corrected_params
                         }
                         
-                        json_response = json.dumps(final_response, ensure_ascii=False, indent=2)
+                        json_response = _dump(final_response)
                         logger.info("Final corrected multiturn response: %s", json_response)
                         yield json_response
                     except Exception as e:
@@ -1046,46 +1368,35 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                         error_response = StructuredResponse(
                             description=f"Error generating multiturn RAG response: {str(e)}"
                         )
-                        yield json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)
+                        yield error_response.model_dump_json()
                 
                 return stream_structured_multiturn_response(), context_to_show
 
         except ConnectTimeout as e:
             logger.warning("Connection timed out while making a request to the LLM endpoint: %s", e)
-            error_response = StructuredResponse(
-                description="Connection timed out while making a request to the NIM endpoint. Verify if the NIM server is available."
-            )
-            return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+            return iter([_ERROR_PAYLOADS["connect_timeout"]]), []
 
         except requests.exceptions.ConnectionError as e:
             if "HTTPConnectionPool" in str(e):
                 logger.error("Connection pool error while connecting to service: %s", e)
-                error_response = StructuredResponse(
-                    description="Connection error: Failed to connect to service. Please verify if all required NIMs are running and accessible."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+                return iter([_ERROR_PAYLOADS["nim_connection_error"]]), []
 
         except Exception as e:
             logger.warning("Failed to generate response due to exception %s", e)
             print_exc()
 
-            if "[403] Forbidden" in str(e) and "Invalid UAM response" in str(e):
+            error_key = _classify_error(e)
+            if error_key == "forbidden":
                 logger.warning("Authentication or permission error: Verify the validity and permissions of your NVIDIA API key.")
-                error_response = StructuredResponse(
-                    description="Authentication or permission error: Verify the validity and permissions of your NVIDIA API key."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
-            elif "[404] Not Found" in str(e):
+                return iter([_ERROR_PAYLOADS["forbidden"]]), []
+            elif error_key == "not_found":
                 logger.warning("Please verify the API endpoint and your payload. Ensure that the model name is valid.")
-                error_response = StructuredResponse(
-                    description="Please verify the API endpoint and your payload. Ensure that the model name is valid."
-                )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+                return iter([_ERROR_PAYLOADS["not_found"]]), []
             else:
                 error_response = StructuredResponse(
                     description=f"Failed to generate RAG chain with multi-turn response. {str(e)}"
                 )
-                return iter([json.dumps(error_response.model_dump(), ensure_ascii=False, indent=2)]), []
+                return iter([error_response.model_dump_json()]), []
 
 
     def document_search(self, content: str, messages: List, reranker_top_k: int, vdb_top_k: int, collection_name: str = "", **kwargs) -> List[Dict[str, Any]]:
@@ -1113,18 +1424,25 @@ Now provide a complete structured vGPU configuration based on this grounded anal
             logger.info("Setting top k as: %s.", top_k)
             retriever = vs.as_retriever(search_kwargs={"k": top_k})  # milvus does not support similarily threshold
 
+            # Similar searches within the same conversation reuse the documents retrieved for an earlier one
+            if retrieval_cache is not None and not ENABLE_REFLECTION:
+                _sync_cache_version(vs, collection_name, kwargs.get("vdb_endpoint"))
+                retrieval_key = content
+                retrieval_scope = _retrieval_cache_scope("search", top_k, reranker_top_k, **kwargs)
+                retrieval_history = [(message.role, message.content) for message in messages]
+                cached_retrieval = retrieval_cache.lookup(retrieval_key, retrieval_scope, collection_name=collection_name,
+                                                          history=retrieval_history)
+                if cached_retrieval is not None:
+                    logger.info("Serving document search from semantic cache, retriever query: %s", cached_retrieval.payload)
+                    return list(cached_retrieval.context)
+
             retriever_query = content
             if messages:
                 if kwargs.get("enable_query_rewriting"):
-                    # conversation is tuple so it should be multiple of two
-                    # -1 is to keep last k conversation
-                    history_count = int(os.environ.get("CONVERSATION_HISTORY", 15)) * 2 * -1
-                    messages = messages[history_count:]
-                    conversation_history = []
-
-                    for message in messages:
-                        if message.role !=  "system":
-                            conversation_history.append((message.role, message.content))
+                    # keep last k conversation, only copying the history when it is longer than that
+                    if len(messages) > CONVERSATION_HISTORY_MESSAGES:
+                        messages = messages[-CONVERSATION_HISTORY_MESSAGES:]
+                    conversation_history = [(message.role, message.content) for message in messages if message.role != "system"]
 
                     # Based on conversation history recreate query for better document retrieval
                     contextualize_q_system_prompt = (
@@ -1135,24 +1453,18 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                         "just reformulate it if needed and otherwise return it as is."
                     )
                     query_rewriter_prompt = prompts.get("query_rewriter_prompt", contextualize_q_system_prompt)
-                    contextualize_q_prompt = ChatPromptTemplate.from_messages(
-                        [("system", query_rewriter_prompt), MessagesPlaceholder("chat_history"), ("human", "{input}"),]
-                    )
-                    q_prompt = contextualize_q_prompt | query_rewriter_llm | StreamingFilterThinkParser | StrOutputParser()
                     # query to be used for document retrieval
-                    logger.info("Query rewriter prompt: %s", contextualize_q_prompt)
-                    retriever_query = q_prompt.invoke({"input": content, "chat_history": conversation_history})
+                    retriever_query = _rewrite_query(query_rewriter_prompt, content, tuple(conversation_history))
                     logger.info("Rewritten Query: %s %s", retriever_query, len(retriever_query))
-                    if retriever_query.replace('"', "'") == "''" or len(retriever_query) == 0:
+                    if _is_empty_query(retriever_query):
                         return []
                 else:
                     # Use previous user queries and current query to form a single query for document retrieval
-                    user_queries = [msg.content for msg in messages if msg.role == "user"]
-                    retriever_query = ". ".join([*user_queries, content])
+                    retriever_query = ". ".join([*(msg.content for msg in messages if msg.role == "user"), content])
                     logger.info("Combined retriever query: %s", retriever_query)
             # Get relevant documents with optional reflection
-            if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true":
-                max_loops = int(os.environ.get("MAX_REFLECTION_LOOP", 3))
+            if ENABLE_REFLECTION:
+                max_loops = MAX_REFLECTION_LOOP
                 reflection_counter = ReflectionCounter(max_loops)
                 docs, is_relevant = check_context_relevance(content, retriever, local_ranker, reflection_counter, kwargs.get("enable_reranker"))
                 if not is_relevant:
@@ -1169,31 +1481,66 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                     # Update number of document to be retriever by ranker
                     local_ranker.top_n = reranker_top_k
 
-                    context_reranker = RunnableAssign({
-                        "context":
-                            lambda input: local_ranker.compress_documents(query=input['question'],
-                                                                        documents=input['context'])
-                    })
-
-                    retriever = {"context": retriever, "question": RunnablePassthrough()} | context_reranker
                     docs = retriever.invoke(retriever_query, config={'run_name':'retriever'})
+                    docs = get_context_reranker().invoke(
+                        {"context": docs, "question": retriever_query, "ranker": local_ranker},
+                        config={'run_name':'context_reranker'})
                     # Normalize scores to 0-1 range"
                     docs = normalize_relevance_scores(docs.get("context", []))
-                    return docs
-            docs = retriever.invoke(retriever_query, config={'run_name':'retriever'})
-            # TODO: Check how to get the relevance score from milvus
-            return docs
+                else:
+                    docs = retriever.invoke(retriever_query, config={'run_name':'retriever'})
+                    # TODO: Check how to get the relevance score from milvus
+                if retrieval_cache is not None:
+                    retrieval_cache.insert(retrieval_key, retrieval_scope, retriever_query,
+                                           context=docs, collection_name=collection_name,
+                                           history=retrieval_history)
+                return docs
 
         except Exception as e:
             raise APIError(f"Failed to search documents. {str(e)}") from e
 
+    def _retrieve_context(self,
+                          retriever,
+                          ranker,
+                          query: str,
+                          top_k: int,
+                          reranker_top_k: int,
+                          normalize: bool = True) -> List[Document]:
+        """Retrieve documents for the query, narrowing them down with the ranker when one is given.
+
+        Reranker scores are normalized to the 0-1 range unless `normalize` is False, in which case
+        the caller is expected to normalize them with `normalize_relevance_scores`.
+        """
+        if not ranker:
+            return retriever.invoke(query, config={'run_name':'retriever'})
+
+        logger.info(
+            "Narrowing the collection from %s results and further narrowing it to "
+            "%s with the reranker for rag chain.",
+            top_k,
+            reranker_top_k)
+        logger.info("Setting ranker top n as: %s.", reranker_top_k)
+        context = retriever.invoke(query, config={'run_name':'retriever'})
+        if _skip_reranking(context, reranker_top_k):
+            logger.debug("Skipping reranker for %d retrieved documents", len(context))
+            return context
+        docs = get_context_reranker().invoke({"context": context, "question": query, "ranker": ranker},
+                                             config={'run_name':'context_reranker'})
+        logger.debug("Document Retrieved: %s", docs)
+        context = docs.get("context", [])
+        # Normalize scores to 0-1 range
+        return normalize_relevance_scores(context) if normalize else context
+
     def print_conversation_history(self, conversation_history: List[str] = None, query: str | None = None):
+        # Skip walking the history entirely unless it is going to be logged
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         if conversation_history is not None:
             for role, content in conversation_history:
-                logger.info("Role: %s", role)
-                logger.info("Content: %s\n", content)
+                logger.debug("Role: %s", role)
+                logger.debug("Content: %s\n", content)
         if query is not None:
-            logger.info("Query: %s\n", query)
+            logger.debug("Query: %s\n", query)
     
     def _should_use_enhanced_mode(self, query: str) -> bool:
         """Determine if enhanced RAG mode should be used for this query."""
@@ -1254,7 +1601,7 @@ Now provide a complete structured vGPU configuration based on this grounded anal
             vs = get_vectorstore(document_embedder, collection_name, vdb_endpoint)
             
             if vs is None:
-                logger.warning(f"Collection {collection_name} not found")
+                logger.warning("Collection %s not found", collection_name)
                 return []
             
             retriever = vs.as_retriever(search_kwargs={"k": top_k})
@@ -1267,7 +1614,7 @@ Now provide a complete structured vGPU configuration based on this grounded anal
             return documents
             
         except Exception as e:
-            logger.error(f"Error retrieving from collection {collection_name}: {e}")
+            logger.error("Error retrieving from collection %s: %s", collection_name, e)
             return []
     
     def _extract_vgpu_profiles_from_context(self, documents: List[Document]) -> set:
@@ -1285,7 +1632,7 @@ Now provide a complete structured vGPU configuration based on this grounded anal
                 if match[0] in ["A40", "L40S", "L40", "L4", "RTX6000"]:
                     found_profiles.add(profile_name)
         
-        logger.info(f"Found vGPU profiles in context: {found_profiles}")
+        logger.info("Found vGPU profiles in context: %s", found_profiles)
         return found_profiles
     
     def _extract_gpu_inventory_from_query(self, query: str) -> Dict[str, int]:
@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""SQLite backed cache of document chunk embeddings, keyed on the chunk content."""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    hash BLOB PRIMARY KEY,
+    model TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    vec BLOB NOT NULL
+)
+"""
+
+
+def _normalize_text(text: str) -> str:
+    """Collapse whitespace so chunks differing only in layout share an embedding."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """Persistent cache of document embeddings for a single embedding model.
+
+    Chunks are keyed on the SHA-256 of the model name and the whitespace normalized chunk text,
+    so re-ingesting a file, or files sharing boilerplate, only embeds the chunks not seen before.
+    """
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def _hash(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\x00{_normalize_text(text)}".encode("utf-8")).digest()
+
+    def embed_documents(self,
+                        texts: List[str],
+                        embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return one embedding per text, calling `embed_fn` once with the texts missing from the cache.
+
+        Args:
+            texts: Texts to be embedded
+            embed_fn: Embeds a list of texts, returning one embedding per text in the same order
+
+        Returns:
+            List[List[float]]: One embedding per text, in the order of `texts`
+        """
+        hashes = [self._hash(text) for text in texts]
+        unique_hashes = list(dict.fromkeys(hashes))
+        cached: Dict[bytes, List[float]] = {}
+        with self._lock:
+            # Stay well below SQLite's limit on the number of bound parameters
+            for i in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embedding_cache WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [self.model, *chunk],
+                )
+                for key, vec in rows:
+                    cached[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+
+        # Embed each missing chunk once, even if it repeats within `texts`
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        logger.info("Embedding cache hits: %d of %d chunks", len(texts) - sum(h in missing for h in hashes), len(texts))
+
+        if missing:
+            embeddings = embed_fn(list(missing.values()))
+            rows = []
+            for key, embedding in zip(missing, embeddings):
+                # Milvus stores float32 vectors, return misses at the precision hits are read back with
+                vec = np.asarray(embedding, dtype=np.float32)
+                cached[key] = vec.tolist()
+                rows.append((key, self.model, int(vec.shape[0]), vec.tobytes()))
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (hash, model, dim, vec) VALUES (?, ?, ?, ?)", rows)
+
+        return [cached[key] for key in hashes]
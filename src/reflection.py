@@ -12,18 +12,31 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import contextvars
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Dict, Any
 
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain_core.prompts.chat import ChatPromptTemplate
-from langchain_core.runnables import RunnableAssign
 
-from .utils import get_llm, get_prompts, get_env_variable
+from .utils import get_context_reranker, get_llm, get_prompts, get_env_variable
 
 logger = logging.getLogger(__name__)
 prompts = get_prompts()
+# Request the reflection query rewrites alongside the relevance checks they may follow. The rewrite
+# is wasted whenever the context is relevant, so this trades reflection LLM load for latency.
+ENABLE_SPECULATIVE_REFLECTION_REWRITE = os.environ.get("ENABLE_SPECULATIVE_REFLECTION_REWRITE", "false").lower() == "true"
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("REFLECTION_MAX_WORKERS", 8)),
+    thread_name_prefix="rag-reflection",
+) if ENABLE_SPECULATIVE_REFLECTION_REWRITE else None
+
+CONTEXT_RELEVANCE_THRESHOLD = int(os.environ.get("CONTEXT_RELEVANCE_THRESHOLD", 1))
+RESPONSE_GROUNDEDNESS_THRESHOLD = int(os.environ.get("RESPONSE_GROUNDEDNESS_THRESHOLD", 1))
+REFLECTION_LLM = get_env_variable(variable_name="REFLECTION_LLM", default_value="mistralai/mixtral-8x22b-instruct-v0.1").strip('"').strip("'")
+REFLECTION_LLM_SERVERURL = os.environ.get("REFLECTION_LLM_SERVERURL", "").strip('"').strip("'")
 
 def _retry_score_generation(chain, inputs: Dict[str, Any], max_retries: int = 3, config: Dict[str, Any] = {}) -> int:
     """Helper method to retry score generation with error handling.
@@ -44,9 +57,9 @@ def _retry_score_generation(chain, inputs: Dict[str, Any], max_retries: int = 3,
                 if str(score) in response:
                     return score
         except Exception as e:
-            logger.warning(f"Retry {retry + 1}/{max_retries} failed: {str(e)}")
+            logger.warning("Retry %d/%d failed: %s", retry + 1, max_retries, e)
             if retry == max_retries - 1:
-                logger.error(f"All retries failed for score generation")
+                logger.error("All retries failed for score generation")
                 return 0
             continue
     return 0
@@ -85,19 +98,16 @@ def check_context_relevance(retriever_query: str,
     Returns:
         Tuple[List[str], bool]: Retrieved documents and whether they meet relevance threshold
     """
-    relevance_threshold = int(os.environ.get("CONTEXT_RELEVANCE_THRESHOLD", 1))
-    reflection_llm_name = get_env_variable(variable_name="REFLECTION_LLM", default_value="mistralai/mixtral-8x22b-instruct-v0.1").strip('"').strip("'")
-    reflection_llm_endpoint = os.environ.get("REFLECTION_LLM_SERVERURL", "").strip('"').strip("'")
     
     llm_params = {
-        "model": reflection_llm_name,
+        "model": REFLECTION_LLM,
         "temperature": 0.2,
         "top_p": 0.9,
         "max_tokens": 512
     }
     
-    if reflection_llm_endpoint:
-        llm_params["llm_endpoint"] = reflection_llm_endpoint
+    if REFLECTION_LLM_SERVERURL:
+        llm_params["llm_endpoint"] = REFLECTION_LLM_SERVERURL
     
     reflection_llm = get_llm(**llm_params)
     
@@ -116,20 +126,25 @@ def check_context_relevance(retriever_query: str,
     while reflection_counter.remaining > 0:
         # Get documents using current query
         if ranker and enable_reranker:
-            context_reranker = RunnableAssign({
-                "context":
-                    lambda input: ranker.compress_documents(query=input['question'], documents=input['context'])
-            })
-
-            retriever = {"context": retriever} | RunnableAssign({"context": lambda input: input["context"]})
             docs = retriever.invoke(current_query, config={'run_name':'retriever'})
-            docs = context_reranker.invoke({"context": docs.get("context", []), "question": current_query}, config={'run_name':'context_reranker'})
+            docs = get_context_reranker().invoke({"context": docs, "question": current_query, "ranker": ranker},
+                                                 config={'run_name':'context_reranker'})
             original_docs = docs.get("context", [])
         else:
             original_docs = retriever.invoke(current_query, config={'run_name':'retriever'})
         
         docs = [d.page_content for d in original_docs]
 
+        # The rewrite does not depend on the relevance score, so it can be requested alongside the
+        # check instead of after it; it is discarded if the context turns out to be relevant.
+        rewrite_chain = query_rewrite_template | reflection_llm | StrOutputParser()
+        rewritten_query = None
+        if ENABLE_SPECULATIVE_REFLECTION_REWRITE and reflection_counter.remaining > 1:
+            rewritten_query = _executor.submit(contextvars.copy_context().run,
+                                               rewrite_chain.invoke,
+                                               {"query": current_query},
+                                               config={'run_name':'query-rewriter'})
+
         context_text = "\n".join(docs)
         relevance_chain = relevance_template | reflection_llm | StrOutputParser()
         relevance_score = _retry_score_generation(
@@ -138,16 +153,20 @@ def check_context_relevance(retriever_query: str,
             config={'run_name':'relevance-checker'}
         )
         
-        logger.info(f"Context relevance score: {relevance_score} (threshold: {relevance_threshold})")
+        logger.info("Context relevance score: %s (threshold: %s)", relevance_score, CONTEXT_RELEVANCE_THRESHOLD)
         reflection_counter.increment()
         
-        if relevance_score >= relevance_threshold:
+        if relevance_score >= CONTEXT_RELEVANCE_THRESHOLD:
+            if rewritten_query is not None:
+                rewritten_query.cancel()
             return original_docs, True
         
-        if reflection_counter.remaining > 0:
-            rewrite_chain = query_rewrite_template | reflection_llm | StrOutputParser()
+        if rewritten_query is not None:
+            current_query = rewritten_query.result()
+            logger.info("Rewritten query (iteration %d): %s", reflection_counter.current_count, current_query)
+        elif reflection_counter.remaining > 0:
             current_query = rewrite_chain.invoke({"query": current_query}, config={'run_name':'query-rewriter'})
-            logger.info(f"Rewritten query (iteration {reflection_counter.current_count}): {current_query}")
+            logger.info("Rewritten query (iteration %d): %s", reflection_counter.current_count, current_query)
     
     return original_docs, False
 
@@ -165,19 +184,16 @@ def check_response_groundedness(response: str,
     Returns:
         Tuple[str, bool]: Final response and whether it meets groundedness threshold
     """
-    groundedness_threshold = int(os.environ.get("RESPONSE_GROUNDEDNESS_THRESHOLD", 1))
-    reflection_llm_name = get_env_variable(variable_name="REFLECTION_LLM", default_value="mistralai/mixtral-8x22b-instruct-v0.1").strip('"').strip("'")
-    reflection_llm_endpoint = os.environ.get("REFLECTION_LLM_SERVERURL", "").strip('"').strip("'")
     
     llm_params = {
-        "model": reflection_llm_name,
+        "model": REFLECTION_LLM,
         "temperature": 0.2,
         "top_p": 0.9,
         "max_tokens": 1024
     }
     
-    if reflection_llm_endpoint:
-        llm_params["llm_endpoint"] = reflection_llm_endpoint
+    if REFLECTION_LLM_SERVERURL:
+        llm_params["llm_endpoint"] = REFLECTION_LLM_SERVERURL
     
     reflection_llm = get_llm(**llm_params)
     
@@ -196,10 +212,10 @@ def check_response_groundedness(response: str,
             {"context": context_text, "response": current_response}
         )
         
-        logger.info(f"Response groundedness score: {groundedness_score} (threshold: {groundedness_threshold})")
+        logger.info("Response groundedness score: %s (threshold: %s)", groundedness_score, RESPONSE_GROUNDEDNESS_THRESHOLD)
         reflection_counter.increment()
         
-        if groundedness_score >= groundedness_threshold:
+        if groundedness_score >= RESPONSE_GROUNDEDNESS_THRESHOLD:
             return current_response, True
         
         if reflection_counter.remaining > 0:
@@ -211,6 +227,71 @@ def check_response_groundedness(response: str,
             
             regen_chain = regen_prompt | reflection_llm | StrOutputParser()
             current_response = regen_chain.invoke({}, config={'run_name':'response-regenerator'})
-            logger.info(f"Regenerated response (iteration {reflection_counter.current_count})")
+            logger.info("Regenerated response (iteration %d)", reflection_counter.current_count)
     
-    return current_response, False 
\ No newline at end of file
+    return current_response, False 
+
+def grounded_generate(chain,
+                      query: str,
+                      context: List[str],
+                      reflection_counter: ReflectionCounter,
+                      config: Dict[str, Any] = {}) -> Tuple[Any, bool]:
+    """Generate a structured response with `chain` and regenerate it until it is grounded in the context.
+
+    Unlike `check_response_groundedness`, regeneration goes through the structured chain itself, so the
+    last generated response is the final one and does not need to be structured again afterwards.
+
+    Args:
+        chain: Structured output chain taking the `question` and `context` inputs
+        query (str): User query
+        context (List[str]): List of context documents
+        reflection_counter: ReflectionCounter instance to track loop count
+
+    Returns:
+        Tuple[Any, bool]: Final structured response and whether it meets groundedness threshold
+    """
+
+    llm_params = {
+        "model": REFLECTION_LLM,
+        "temperature": 0.2,
+        "top_p": 0.9,
+        "max_tokens": 1024
+    }
+
+    if REFLECTION_LLM_SERVERURL:
+        llm_params["llm_endpoint"] = REFLECTION_LLM_SERVERURL
+
+    reflection_llm = get_llm(**llm_params)
+
+    groundedness_template = ChatPromptTemplate.from_messages([
+        ("system", prompts["reflection_groundedness_check_prompt"]["system"]),
+        ("human", "{context}\n\n{response}")
+    ])
+    groundedness_chain = groundedness_template | reflection_llm | StrOutputParser()
+
+    context_text = "\n".join(context)
+    current_response = chain.invoke({"question": query, "context": context}, config=config)
+
+    while reflection_counter.remaining > 0:
+        groundedness_score = _retry_score_generation(
+            groundedness_chain,
+            {"context": context_text, "response": current_response.description}
+        )
+
+        logger.info("Response groundedness score: %s (threshold: %s)", groundedness_score, RESPONSE_GROUNDEDNESS_THRESHOLD)
+        reflection_counter.increment()
+
+        if groundedness_score >= RESPONSE_GROUNDEDNESS_THRESHOLD:
+            return current_response, True
+
+        if reflection_counter.remaining > 0:
+            regen_query = (f"Original query: {query}\n\n"
+                           f"Previous response: {current_response.description}\n\n"
+                           "The previous response was not fully grounded in the context documents. "
+                           "Provide a new, more grounded structured vGPU configuration using ONLY information "
+                           "found in the context documents.")
+            current_response = chain.invoke({"question": regen_query, "context": context},
+                                            config={**config, 'run_name':'response-regenerator'})
+            logger.info("Regenerated response (iteration %d)", reflection_counter.current_count)
+
+    return current_response, False
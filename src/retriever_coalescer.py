@@ -0,0 +1,312 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Coalesce concurrent vector store searches and query embeddings into batched calls."""
+import abc
+import atexit
+import inspect
+import logging
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from functools import lru_cache
+from importlib import metadata
+from typing import Any, Dict, Hashable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger(__name__)
+
+# langchain-milvus release whose internals the single multi-vector search below relies on.
+# Other releases search each query of a batch through the public vector store API instead.
+_BATCHED_SEARCH_LANGCHAIN_MILVUS_VERSION = "0.1.10"
+
+
+def _langchain_milvus_version() -> Optional[str]:
+    try:
+        return metadata.version("langchain-milvus")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+@dataclass
+class _SearchRequest:
+    query: str
+    k: int
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class _EmbedRequest:
+    query: str
+    future: Future = field(default_factory=Future)
+
+
+@lru_cache(maxsize=None)
+def _has_batched_query_embedding(embedder_type: type) -> bool:
+    """Whether `embedder_type` embeds a batch of queries through `_embed(texts, model_type=...)`.
+
+    NVIDIAEmbeddings only exposes its batched embedding publicly as `embed_documents`, which
+    produces passage embeddings, so its private batched path is used when it has the expected shape.
+    """
+    embed = getattr(embedder_type, "_embed", None)
+    if not callable(embed):
+        return False
+    try:
+        return "model_type" in inspect.signature(embed).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _embed_queries(embedder, queries: List[str]) -> List[List[float]]:
+    if _has_batched_query_embedding(type(embedder)):
+        return embedder._embed(queries, model_type="query")
+    # Embedding queries with embed_documents may not match embed_query, so embed them one by one
+    return [embedder.embed_query(query) for query in queries]
+
+
+_batchers: "weakref.WeakSet[_MicroBatcher]" = weakref.WeakSet()
+
+
+class _MicroBatcher(abc.ABC):
+    """Collect the requests submitted within `flush_ms` of each other into batches.
+
+    A worker thread collects requests until `max_batch` of them are queued or `flush_ms` has elapsed
+    since the first one, and hands each batch to `_process_batch` on a small pool, so a slow batch
+    does not hold up the next one. Every open batcher is closed at interpreter exit.
+    """
+
+    # Queued by `close` to stop the worker thread
+    _STOP = object()
+
+    def __init__(self, name: str, flush_ms: float, max_batch: int, max_queue: int, max_workers: int):
+        self.flush_seconds = flush_ms / 1000
+        self.max_batch = max_batch
+        self._closed = False
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"rag-batch-{name}")
+        self._worker = threading.Thread(target=self._run, name=f"rag-{name}-coalescer", daemon=True)
+        self._worker.start()
+        _batchers.add(self)
+
+    def _put(self, request: Any) -> None:
+        # Never block while holding the lock, so a full queue cannot hold up other submitters or close
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{type(self).__name__} is closed.")
+            try:
+                self._queue.put_nowait(request)
+            except queue.Full:
+                raise RuntimeError(f"{type(self).__name__} has {self._queue.maxsize} requests queued already.") from None
+
+    def close(self) -> None:
+        """Stop collecting requests, waiting for the batches already collected to complete."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        # No request can be queued once closed, so the worker stops after the ones already queued
+        self._queue.put(self._STOP)
+        self._worker.join()
+        self._executor.shutdown(wait=True)
+
+    def _run(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is self._STOP:
+                return
+            batch = [request]
+            stop = False
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is self._STOP:
+                    stop = True
+                    break
+                batch.append(request)
+            self._executor.submit(self._process_batch, batch)
+            if stop:
+                return
+
+    @abc.abstractmethod
+    def _process_batch(self, batch: List[Any]) -> None:
+        """Complete the future of every request in `batch`."""
+
+
+@atexit.register
+def _close_batchers() -> None:
+    for batcher in list(_batchers):
+        batcher.close()
+
+
+def _is_multi_vector(vectorstore) -> bool:
+    """Whether `vectorstore` searches several vector fields (hybrid search) for each query."""
+    return len(getattr(vectorstore, "vector_fields", None) or [None]) > 1
+
+
+class BatchingRetriever(_MicroBatcher):
+    """Batch the searches submitted within `flush_ms` of each other against a dense Milvus collection.
+
+    The queries of a batch are embedded with a single call to the embedding model. With the
+    langchain-milvus release this module was written against, they are then searched with a
+    single multi-vector Milvus search, whose per-query hits are returned to the matching futures;
+    with any other release each query is searched through `similarity_search_with_score_by_vector`.
+    """
+
+    def __init__(self,
+                 vectorstore,
+                 embedder,
+                 flush_ms: float = 10,
+                 max_batch: int = 16,
+                 max_queue: int = 1024,
+                 max_workers: int = 4):
+        if _is_multi_vector(vectorstore):
+            raise ValueError("Batched retrieval is only supported for dense vector search.")
+        self.vectorstore = vectorstore
+        self.embedder = embedder
+        self.batched_search = _langchain_milvus_version() == _BATCHED_SEARCH_LANGCHAIN_MILVUS_VERSION
+        if not self.batched_search:
+            logger.info("langchain-milvus %s is not %s, searching the queries of a batch one at a time",
+                        _langchain_milvus_version(), _BATCHED_SEARCH_LANGCHAIN_MILVUS_VERSION)
+        super().__init__("search", flush_ms, max_batch, max_queue, max_workers)
+
+    def submit(self, query: str, k: int) -> "Future[List[Document]]":
+        """Queue a search for the `k` documents closest to `query`."""
+        request = _SearchRequest(query=query, k=k)
+        self._put(request)
+        return request.future
+
+    def search(self, query: str, k: int) -> List[Document]:
+        """Search for the `k` documents closest to `query`, blocking until its batch completes."""
+        return self.submit(query, k).result()
+
+    def as_retriever(self, k: int) -> "CoalescedRetriever":
+        """Return a LangChain retriever returning the `k` closest documents through this coalescer."""
+        return CoalescedRetriever(coalescer=self, k=k)
+
+    def _search_vectors(self, vectors: List[List[float]], k: int) -> List[List[Document]]:
+        vs = self.vectorstore
+        if not self.batched_search:
+            return [[doc for doc, _ in vs.similarity_search_with_score_by_vector(vector, k=k)] for vector in vectors]
+        # Hits are sorted by distance, so searching for the largest k serves every request
+        results = vs.col.search(
+            data=vectors,
+            anns_field=vs._vector_field,
+            param=vs._as_list(vs.search_params)[0],
+            limit=k,
+            output_fields=["*"] if vs.enable_dynamic_field else vs._remove_forbidden_fields(vs.fields[:]),
+            timeout=vs.timeout,
+        )
+        return [[doc for doc, _ in vs._parse_documents_from_search_results([hits])] for hits in results]
+
+    def _process_batch(self, batch: List[_SearchRequest]) -> None:
+        try:
+            logger.debug("Searching a batch of %d queries", len(batch))
+            vectors = _embed_queries(self.embedder, [request.query for request in batch])
+            results = self._search_vectors(vectors, max(request.k for request in batch))
+            for request, docs in zip(batch, results):
+                request.future.set_result(docs[:request.k])
+        except Exception as e:
+            logger.warning("Batched vector search failed: %s", e)
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+
+class BatchingQueryEmbedder(_MicroBatcher):
+    """Embed the queries submitted within `flush_ms` of each other with a single embedding call.
+
+    Exposes `embed_query`, so it can stand in for the embedding model wherever queries are embedded
+    one at a time from many threads, such as the semantic cache lookups.
+    """
+
+    def __init__(self,
+                 embedder,
+                 flush_ms: float = 10,
+                 max_batch: int = 32,
+                 max_queue: int = 1024,
+                 max_workers: int = 4):
+        self.embedder = embedder
+        super().__init__("embed", flush_ms, max_batch, max_queue, max_workers)
+
+    def submit(self, query: str) -> "Future[List[float]]":
+        """Queue `query` to be embedded with the next batch."""
+        request = _EmbedRequest(query=query)
+        self._put(request)
+        return request.future
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed `query`, blocking until its batch completes."""
+        return self.submit(query).result()
+
+    def _process_batch(self, batch: List[_EmbedRequest]) -> None:
+        try:
+            logger.debug("Embedding a batch of %d queries", len(batch))
+            vectors = _embed_queries(self.embedder, [request.query for request in batch])
+            for request, vector in zip(batch, vectors):
+                request.future.set_result(vector)
+        except Exception as e:
+            logger.warning("Batched query embedding failed: %s", e)
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+
+class CoalescedRetriever(BaseRetriever):
+    """LangChain retriever submitting its searches to a `BatchingRetriever`."""
+
+    coalescer: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.coalescer.search(query, self.k)
+
+
+_coalescers: Dict[Hashable, BatchingRetriever] = {}
+_coalescers_lock = threading.Lock()
+
+
+def get_batching_retriever(key: Hashable, vectorstore, embedder, **kwargs) -> Optional[BatchingRetriever]:
+    """Return the coalescer shared by the searches against `key`, creating it from `vectorstore` if needed.
+
+    An existing coalescer is switched over to `vectorstore` when it is given a new handle.
+
+    Returns None for hybrid (multi-vector) collections, which cannot be searched in a single batch.
+    """
+    if _is_multi_vector(vectorstore):
+        return None
+    with _coalescers_lock:
+        coalescer = _coalescers.get(key)
+        if coalescer is None:
+            coalescer = BatchingRetriever(vectorstore, embedder, **kwargs)
+            _coalescers[key] = coalescer
+            logger.info("Created batching retriever for %s", key)
+        elif coalescer.vectorstore is not vectorstore:
+            # The vectorstore handle was recreated, e.g. because the collection was recreated
+            coalescer.vectorstore = vectorstore
+        return coalescer
@@ -0,0 +1,214 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""In-process semantic cache for structured chain responses."""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_query(query: str) -> str:
+    """Lower-case the query and collapse whitespace so trivial variations share a key."""
+    return " ".join(query.lower().split())
+
+
+def _history_digest(history: Iterable[Tuple[str, str]]) -> str:
+    """Stable digest of (role, content) pairs which scope a cached response."""
+    digest = hashlib.sha256()
+    for role, content in history:
+        digest.update(f"{role}\x00{content}\x01".encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    """A cached chain response along with the documents used to generate it."""
+    payload: str
+    context: List[Any] = field(default_factory=list)
+
+
+@dataclass
+class _CacheEntry:
+    scope: Tuple[str, str, int, str]
+    vector: np.ndarray
+    response: CachedResponse
+    created_at: float
+
+
+class SemanticQueryCache:
+    """LRU/TTL cache of chain responses looked up by query embedding similarity.
+
+    An exact match on the normalized query is served without touching the embedder.
+    Otherwise the query is embedded and compared, by cosine similarity, against the
+    cached queries sharing the same model, collection, collection generation and
+    conversation history. Bumping the generation of a collection (see `invalidate`)
+    makes every response cached for it unreachable.
+    """
+
+    def __init__(self,
+                 embedder,
+                 similarity_threshold: float = 0.95,
+                 ttl_seconds: float = 300,
+                 max_entries: int = 1024):
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._versions: Dict[Tuple[str, str], Any] = {}
+        # Query vectors computed by a missed lookup, reused by the matching insert
+        self._pending: "OrderedDict[str, Tuple[np.ndarray, int]]" = OrderedDict()
+
+    def _scope(self, model: str, collection_name: str, history: Iterable[Tuple[str, str]]) -> Tuple[str, str, int, str]:
+        return (str(model), collection_name, self._generations.get(collection_name, 0), _history_digest(history))
+
+    @staticmethod
+    def _key(query: str, scope: Tuple[Any, ...]) -> str:
+        raw = "\x00".join([*(str(part) for part in scope), _normalize_query(query)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict_expired(self) -> None:
+        expiry = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry.created_at < expiry]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+    def lookup(self,
+               query: str,
+               model: str,
+               collection_name: str = "",
+               history: Iterable[Tuple[str, str]] = ()) -> Optional[CachedResponse]:
+        """Return the cached response for a query similar enough to `query`, if any."""
+        history = tuple(history)
+        with self._lock:
+            self._evict_expired()
+            scope = self._scope(model, collection_name, history)
+            key = self._key(query, scope)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                logger.debug("Semantic cache exact hit for query: %s", query)
+                return entry.response
+
+        vector = self._embed(query)
+
+        with self._lock:
+            # Pending vectors are keyed without the generation so an insert can tell the collection moved on
+            self._pending[self._key(query, scope[:2] + scope[3:])] = (vector, scope[2])
+            while len(self._pending) > self.max_entries:
+                self._pending.popitem(last=False)
+
+            candidates = [(k, e) for k, e in self._entries.items() if e.scope == scope]
+            if candidates:
+                similarities = np.stack([e.vector for _, e in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    best_key, best_entry = candidates[best]
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    logger.debug("Semantic cache hit for query: %s (similarity %.4f)", query, similarities[best])
+                    return best_entry.response
+            self.misses += 1
+            return None
+
+    def insert(self,
+               query: str,
+               model: str,
+               payload: str,
+               context: Optional[List[Any]] = None,
+               collection_name: str = "",
+               history: Iterable[Tuple[str, str]] = ()) -> None:
+        """Cache `payload` as the response to `query`."""
+        history = tuple(history)
+        with self._lock:
+            scope = self._scope(model, collection_name, history)
+            key = self._key(query, scope)
+            pending = self._pending.pop(self._key(query, scope[:2] + scope[3:]), None)
+        if pending is not None:
+            vector, generation = pending
+            if generation != scope[2]:
+                # The collection was invalidated while this response was being generated
+                return
+        else:
+            vector = self._embed(query)
+
+        with self._lock:
+            if scope[2] != self._generations.get(collection_name, 0):
+                return
+            self._entries[key] = _CacheEntry(
+                scope=scope,
+                vector=vector,
+                response=CachedResponse(payload=payload, context=list(context or [])),
+                created_at=time.monotonic(),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection_name: str = "") -> None:
+        """Drop every response cached for `collection_name` by bumping its generation."""
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry.scope[1] == collection_name]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+        logger.info("Invalidated %d semantic cache entries for collection '%s'", len(stale), collection_name)
+
+    def sync_version(self, collection_name: str, version: Any, vdb_endpoint: str = "") -> None:
+        """Invalidate `collection_name` if `version` differs from the version last seen for it.
+
+        `version` is read from the collection itself, such as its entity count, so writes made
+        by other processes, like the ingestor server, also invalidate the responses cached for it.
+        Versions are tracked per `vdb_endpoint`, as collections of the same name on different
+        vector databases change independently.
+        """
+        with self._lock:
+            previous = self._versions.get((vdb_endpoint, collection_name))
+            self._versions[(vdb_endpoint, collection_name)] = version
+        if previous is not None and previous != version:
+            self.invalidate(collection_name)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters along with the current size of the cache."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
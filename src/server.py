@@ -27,6 +27,7 @@ from typing import Union
 from uuid import uuid4
 
 import bleach
+import orjson
 from fastapi import FastAPI, Request, File, Form, Depends, HTTPException, Query, BackgroundTasks
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
@@ -40,9 +41,11 @@ from pydantic import validator
 from pydantic import field_validator, model_validator
 from pymilvus.exceptions import MilvusException
 from pymilvus.exceptions import MilvusUnavailableException
+from starlette.concurrency import iterate_in_threadpool
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 from langchain_core.documents import Document
 from src.chains import UnstructuredRAG
+from src.chains import accumulate_structured_chunk, is_structured_delta
 from src.apply_configuration import VGPUConfigurationApplier, ApplyConfigurationRequest
 
 from .utils import (
@@ -831,9 +834,9 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
     if metrics:
         metrics.update_api_requests(method=request.method, endpoint=request.url.path)
     try:
-        logger.debug(f"Prompt: {prompt}")
+        logger.debug("Prompt: %s", prompt)
         chat_history = [msg for msg in prompt.messages if not (msg.role == 'assistant' and not msg.content.strip())]
-        logger.debug(f"Chat history: {chat_history}")
+        logger.debug("Chat history: %s", chat_history)
         collection_name = prompt.collection_name
 
         # Helper function to escape JSON-like structures in content
@@ -873,14 +876,14 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
 
         if prompt.use_knowledge_base:
             logger.info("Knowledge base is enabled. Using rag chain for response generation.")
-            generator, contexts = UNSTRUCTURED_RAG.rag_chain(query=last_user_message,
+            generator, contexts = await UNSTRUCTURED_RAG.rag_chain_async(query=last_user_message,
                                           chat_history=processed_chat_history,
                                           reranker_top_k=prompt.reranker_top_k,
                                           vdb_top_k=prompt.vdb_top_k,
                                           collection_name=collection_name,
                                           **kwargs)
         else:
-            generator = UNSTRUCTURED_RAG.llm_chain(query=last_user_message, chat_history=processed_chat_history, **kwargs)
+            generator = await UNSTRUCTURED_RAG.llm_chain_async(query=last_user_message, chat_history=processed_chat_history, **kwargs)
 
         def response_generator():
             """Convert generator streaming response into `data: ChainResponse` format for chunk"""
@@ -902,18 +905,18 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
                         
                         # Try to parse chunk as JSON (structured output)
                         try:
-                            structured_data = json.loads(chunk)
-                            
-                            # Log vGPU configuration metadata for debugging/monitoring
-                            if structured_data.get("title"):
-                                logger.info(f"vGPU Config Title: {structured_data.get('title')}")
-                            if structured_data.get("parameters"):
-                                logger.info(f"vGPU Parameters: {structured_data.get('parameters')}")
-                            
-                                                        # Return the clean structured JSON response
-                            # Format the JSON nicely for display
-                            json_response = json.dumps(structured_data, indent=2, ensure_ascii=False)
-                            accumulated_response += json_response
+                            structured_data = orjson.loads(chunk)
+
+                            if not is_structured_delta(structured_data):
+                                # Log vGPU configuration metadata for debugging/monitoring
+                                if structured_data.get("title"):
+                                    logger.info("vGPU Config Title: %s", structured_data.get("title"))
+                                if structured_data.get("parameters"):
+                                    logger.info("vGPU Parameters: %s", structured_data.get("parameters"))
+
+                            # Description deltas are appended, the final structured JSON response replaces them
+                            accumulated_response, json_response = accumulate_structured_chunk(
+                                accumulated_response, structured_data)
                             
                             chain_response = ChainResponse()
                             response_choice = ChainResponseChoices(
@@ -1073,7 +1076,8 @@ async def document_search(request: Request, data: DocumentSearch) -> Dict[str, L
             excluded_keys = {"query", "reranker_top_k", "vdb_top_k", "collection_name", "messages"}
             kwargs = {key: value for key, value in vars(data).items() if key not in excluded_keys}
 
-            docs = UNSTRUCTURED_RAG.document_search(content=data.query, messages=data.messages, reranker_top_k=data.reranker_top_k, vdb_top_k=data.vdb_top_k, collection_name=data.collection_name, **kwargs)
+            # Query rewriting, retrieval and reranking are blocking calls, keep them off the event loop
+            docs = await asyncio.to_thread(UNSTRUCTURED_RAG.document_search, content=data.query, messages=data.messages, reranker_top_k=data.reranker_top_k, vdb_top_k=data.vdb_top_k, collection_name=data.collection_name, **kwargs)
             citations = prepare_citations(
                 collection_name=data.collection_name,
                 retrieved_documents=docs,
@@ -1123,9 +1127,9 @@ async def generate_structured_answer(request: Request, prompt: Prompt) -> JSONRe
         metrics.update_api_requests(method=request.method, endpoint=request.url.path)
     try:
         import json
-        logger.debug(f"Prompt: {prompt}")
+        logger.debug("Prompt: %s", prompt)
         chat_history = [msg for msg in prompt.messages if not (msg.role == 'assistant' and not msg.content.strip())]
-        logger.debug(f"Chat history: {chat_history}")
+        logger.debug("Chat history: %s", chat_history)
         collection_name = prompt.collection_name
 
         # Helper function to escape JSON-like structures in content
@@ -1164,20 +1168,24 @@ async def generate_structured_answer(request: Request, prompt: Prompt) -> JSONRe
 
         if prompt.use_knowledge_base:
             logger.info("Knowledge base is enabled. Using rag chain for structured response generation.")
-            generator, contexts = UNSTRUCTURED_RAG.rag_chain(query=last_user_message,
+            generator, contexts = await UNSTRUCTURED_RAG.rag_chain_async(query=last_user_message,
                                           chat_history=processed_chat_history,
                                           reranker_top_k=prompt.reranker_top_k,
                                           vdb_top_k=prompt.vdb_top_k,
                                           collection_name=collection_name,
                                           **kwargs)
         else:
-            generator = UNSTRUCTURED_RAG.llm_chain(query=last_user_message, chat_history=processed_chat_history, **kwargs)
+            generator = await UNSTRUCTURED_RAG.llm_chain_async(query=last_user_message, chat_history=processed_chat_history, **kwargs)
 
         # Extract the structured response from the generator
         if generator:
-            for chunk in generator:
+            # The chains yield from blocking model calls, iterate them off the event loop
+            async for chunk in iterate_in_threadpool(generator):
                 try:
-                    structured_response = json.loads(chunk)
+                    structured_response = orjson.loads(chunk)
+                    if is_structured_delta(structured_response):
+                        # Skip the streamed description deltas, the full response follows them
+                        continue
                     break  # We only need the first (and only) structured response
                 except json.JSONDecodeError:
                     # If not JSON, create a structured vGPU wrapper
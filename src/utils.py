@@ -15,6 +15,7 @@
 """Utility functions used across different modules of the RAG."""
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from functools import wraps
 from pathlib import Path
@@ -24,13 +25,17 @@ from typing import Dict
 from typing import List
 from typing import Any
 from typing import Optional
+from typing import Union
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import yaml
-import math
+import numpy as np
 import aiohttp
 import asyncio
+import threading
 import time
 
 logger = logging.getLogger(__name__)
@@ -94,6 +99,10 @@ if TYPE_CHECKING:
     from .configuration_wizard import ConfigWizard
 
 DEFAULT_MAX_CONTEXT = 1500
+# Connection pool sizing of the HTTP session shared by the NIM clients
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 20))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 100))
+ENABLE_SOURCE_METADATA = os.environ.get("ENABLE_SOURCE_METADATA", "True").lower() == "true"
 ENABLE_NV_INGEST_VDB_UPLOAD = True # When enabled entire ingestion would be performed using nv-ingest
 
 # pylint: disable=unnecessary-lambda-assignment
@@ -202,7 +211,7 @@ def create_vectorstore_langchain(document_embedder, collection_name: str = "", v
             connections.disconnect(connection_alias)
             return None
 
-        logger.debug(f"Collection '{collection_name}' exists. Proceeding with vector store creation.")
+        logger.debug("Collection '%s' exists. Proceeding with vector store creation.", collection_name)
 
         if config.vector_store.search_type == "hybrid":
             logger.info("Creating Langchain Milvus object for Hybrid search")
@@ -245,6 +254,13 @@ def create_vectorstore_langchain(document_embedder, collection_name: str = "", v
     return vectorstore
 
 
+# Seconds a vectorstore handle is reused before it is recreated. Collections are also dropped and
+# recreated by the ingestor server, which cannot evict the handles cached by this process.
+VECTORSTORE_CACHE_TTL = float(os.environ.get("VECTORSTORE_CACHE_TTL", 60))
+_vectorstores: Dict[tuple, tuple] = {}
+_vectorstores_lock = threading.Lock()
+
+
 def get_vectorstore(
         document_embedder: "Embeddings",
         collection_name: str = "",
@@ -253,8 +269,36 @@ def get_vectorstore(
     Send a vectorstore object.
     If a Vectorstore object already exists, the function returns that object.
     Otherwise, it creates a new Vectorstore object and returns it.
+
+    Vectorstores are reused per collection, endpoint and embedding model for up to
+    VECTORSTORE_CACHE_TTL seconds; the embedding models are cached by get_embedding_model, so their
+    identity is part of the key. Missing collections are not cached, so a collection created later
+    is picked up, and a collection dropped elsewhere is noticed once its handle expires.
     """
-    return create_vectorstore_langchain(document_embedder, collection_name, vdb_endpoint)
+    key = (collection_name, vdb_endpoint or "", id(document_embedder))
+    with _vectorstores_lock:
+        cached = _vectorstores.get(key)
+    if (cached is not None and cached[0] is document_embedder
+            and time.monotonic() - cached[2] < VECTORSTORE_CACHE_TTL):
+        return cached[1]
+
+    vectorstore = create_vectorstore_langchain(document_embedder, collection_name, vdb_endpoint)
+    with _vectorstores_lock:
+        if vectorstore is not None:
+            _vectorstores[key] = (document_embedder, vectorstore, time.monotonic())
+        else:
+            _vectorstores.pop(key, None)
+    return vectorstore
+
+
+def _forget_vectorstores(collection_name: str) -> None:
+    """Drop the cached vectorstores of a deleted collection."""
+    names = {collection_name}
+    if collection_name == os.getenv('COLLECTION_NAME', "vector_db"):
+        names.add("")
+    with _vectorstores_lock:
+        for key in [key for key in _vectorstores if key[0] in names]:
+            del _vectorstores[key]
 
 
 def create_collections(collection_names: List[str], vdb_endpoint: str, dimension: int = 768, collection_type: str = "text") -> Dict[str, any]:
@@ -395,6 +439,7 @@ def delete_collections(vdb_endpoint: str, collection_names: List[str]) -> dict:
             try:
                 if utility.has_collection(collection, using=connection_alias):
                     utility.drop_collection(collection, using=connection_alias)
+                    _forget_vectorstores(collection)
                     deleted_collections.append(collection)
                     logger.info(f"Deleted collection: {collection}")
                 else:
@@ -425,6 +470,38 @@ def delete_collections(vdb_endpoint: str, collection_names: List[str]) -> dict:
             "total_failed": len(collection_names)
         }
 
+@lru_cache
+def get_http_session() -> requests.Session:
+    """Return the keep-alive HTTP session shared by all the NIM clients.
+
+    Only connection errors are retried, as the request never reached the server for those.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=Retry(total=3, connect=3, read=0, backoff_factor=0.3, allowed_methods=None),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    logger.info("Created shared HTTP session with pool_connections=%d, pool_maxsize=%d",
+                HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE)
+    return session
+
+
+def _use_shared_http_session(client):
+    """Route the requests of a langchain_nvidia_ai_endpoints client through the shared HTTP session.
+
+    The client otherwise creates a new `requests.Session` for every call, paying a fresh
+    TCP (and TLS) handshake each time.
+    """
+    nvidia_client = getattr(client, "_client", None)
+    if nvidia_client is not None and hasattr(nvidia_client, "get_session_fn"):
+        session = get_http_session()
+        nvidia_client.get_session_fn = lambda: session
+    return client
+
+
 @utils_cache
 @lru_cache()
 def get_llm(**kwargs) -> LLM | SimpleChatModel:
@@ -473,19 +550,19 @@ def get_llm(**kwargs) -> LLM | SimpleChatModel:
                     raise RuntimeError(error_msg)
 
         if url:
-            logger.debug(f"Length of llm endpoint url string {url}")
+            logger.debug("Length of llm endpoint url string %s", url)
             logger.info("Using llm model %s hosted at %s", kwargs.get('model'), url)
-            return ChatNVIDIA(base_url=url,
-                              model=kwargs.get('model'),
-                              temperature=kwargs.get('temperature', None),
-                              top_p=kwargs.get('top_p', None),
-                              max_tokens=kwargs.get('max_tokens', None))
+            return _use_shared_http_session(ChatNVIDIA(base_url=url,
+                                                       model=kwargs.get('model'),
+                                                       temperature=kwargs.get('temperature', None),
+                                                       top_p=kwargs.get('top_p', None),
+                                                       max_tokens=kwargs.get('max_tokens', None)))
 
         logger.info("Using llm model %s from api catalog", kwargs.get('model'))
-        return ChatNVIDIA(model=kwargs.get('model'),
-                          temperature=kwargs.get('temperature', None),
-                          top_p=kwargs.get('top_p', None),
-                          max_tokens=kwargs.get('max_tokens', None))
+        return _use_shared_http_session(ChatNVIDIA(model=kwargs.get('model'),
+                                                   temperature=kwargs.get('temperature', None),
+                                                   top_p=kwargs.get('top_p', None),
+                                                   max_tokens=kwargs.get('max_tokens', None)))
 
     raise RuntimeError(
         "Unable to find any supported Large Language Model server. Supported engine name is nvidia-ai-endpoints.")
@@ -521,12 +598,12 @@ def get_embedding_model(model: str, url: str) -> Embeddings:
             logger.info("Using embedding model %s hosted at %s",
                         model,
                         url)
-            return NVIDIAEmbeddings(base_url=url,
-                                    model=model,
-                                    truncate="END")
+            return _use_shared_http_session(NVIDIAEmbeddings(base_url=url,
+                                                             model=model,
+                                                             truncate="END"))
 
         logger.info("Using embedding model %s hosted at api catalog", model)
-        return NVIDIAEmbeddings(model=model, truncate="END")
+        return _use_shared_http_session(NVIDIAEmbeddings(model=model, truncate="END"))
 
     raise RuntimeError(
         "Unable to find any supported embedding model. Supported engine is huggingface and nvidia-ai-endpoints.")
@@ -549,13 +626,13 @@ def _get_ranking_model(model="", url="", top_n=4) -> BaseDocumentCompressor:
         if settings.ranking.model_engine == "nvidia-ai-endpoints":
             if url:
                 logger.info("Using ranking model hosted at %s", url)
-                return NVIDIARerank(base_url=url,
-                                    top_n=top_n,
-                                    truncate="END")
+                return _use_shared_http_session(NVIDIARerank(base_url=url,
+                                                             top_n=top_n,
+                                                             truncate="END"))
 
             if model:
                 logger.info("Using ranking model %s hosted at api catalog", model)
-                return NVIDIARerank(model=model, top_n=top_n, truncate="END")
+                return _use_shared_http_session(NVIDIARerank(model=model, top_n=top_n, truncate="END"))
         else:
             logger.warning("Unable to find any supported ranking model. Supported engine is nvidia-ai-endpoints.")
     except Exception as e:
@@ -572,6 +649,33 @@ def get_ranking_model(model="", url="", top_n=4) -> BaseDocumentCompressor:
         ranker = _get_ranking_model(model, url, top_n)
     return ranker
 
+def embed_documents_in_batches(
+        document_embedder: "Embeddings",
+        texts: List[str],
+        batch_size: int = 64,
+        max_workers: int = 4
+    ) -> List[List[float]]:
+    """Embed texts in fixed size batches, overlapping the embedding requests across a thread pool.
+
+    Args:
+        document_embedder: Embedding model used to embed the texts
+        texts: Texts to be embedded
+        batch_size: Number of texts sent per embedding request
+        max_workers: Maximum number of embedding requests in flight
+
+    Returns:
+        List[List[float]]: One embedding per text, in the order of `texts`
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if len(batches) <= 1:
+        return document_embedder.embed_documents(texts) if texts else []
+
+    logger.debug("Embedding %d texts in %d batches of %d", len(texts), len(batches), batch_size)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        results = executor.map(document_embedder.embed_documents, batches)
+        return [embedding for batch in results for embedding in batch]
+
+
 def get_text_splitter() -> RecursiveCharacterTextSplitter:
     """Return the token text splitter instance from langchain."""
 
@@ -854,15 +958,12 @@ def format_document_with_source(doc) -> str:
              otherwise returns just the content
     """
     # Debug log before formatting
-    logger.debug(f"Before format_document_with_source - Document: {doc}")
-
-    # Check if source metadata is enabled via environment variable
-    enable_metadata = os.getenv('ENABLE_SOURCE_METADATA', 'True').lower() == 'true'
+    logger.debug("Before format_document_with_source - Document: %s", doc)
 
     # Return just content if metadata is disabled or doc has no metadata
-    if not enable_metadata or not hasattr(doc, 'metadata'):
+    if not ENABLE_SOURCE_METADATA or not hasattr(doc, 'metadata'):
         result = doc.page_content
-        logger.debug(f"After format_document_with_source (metadata disabled) - Result: {result}")
+        logger.debug("After format_document_with_source (metadata disabled) - Result: %s", result)
         return result
 
     # Handle nested metadata structure
@@ -872,15 +973,15 @@ def format_document_with_source(doc) -> str:
     # If no source path is found, return just the content
     if not source_path:
         result = doc.page_content
-        logger.debug(f"After format_document_with_source (no source path) - Result: {result}")
+        logger.debug("After format_document_with_source (no source path) - Result: %s", result)
         return result
 
     filename = os.path.splitext(os.path.basename(source_path))[0]
-    logger.info(f"Before format_document_with_source - Filename: {filename}")
+    logger.debug("Before format_document_with_source - Filename: %s", filename)
     result = f"File: {filename}\nContent: {doc.page_content}"
 
     # Debug log after formatting
-    logger.debug(f"After format_document_with_source - Result: {result}")
+    logger.debug("After format_document_with_source - Result: %s", result)
 
     return result
 
@@ -1046,28 +1147,56 @@ def get_streaming_filter_think_parser():
         # If filtering is disabled, use a passthrough that passes content as-is
         return RunnablePassthrough()
 
-def normalize_relevance_scores(documents: List["Document"]) -> List["Document"]:
+def _rerank_context(inputs: Dict[str, Any]) -> List["Document"]:
+    return inputs["ranker"].compress_documents(query=inputs["question"], documents=inputs["context"])
+
+@lru_cache
+def get_context_reranker():
+    """
+    Returns the runnable reranking documents, built once and shared by every request.
+
+    The runnable is invoked with the retrieved documents under "context", the query under "question"
+    and the ranker under "ranker", and assigns the reranked documents to "context".
+
+    Returns:
+        RunnableAssign: The context reranking runnable
+    """
+    from langchain_core.runnables import RunnableAssign, RunnableLambda
+
+    return RunnableAssign({"context": RunnableLambda(_rerank_context)})
+
+def normalize_relevance_scores(documents: List["Document"],
+                               format_fn: Optional[Callable[["Document"], str]] = None) -> Union[List["Document"], List[str]]:
     """
     Normalize relevance scores in a list of documents to be between 0 and 1 using sigmoid function.
 
     Args:
         documents: List of Document objects with relevance_score in metadata
+        format_fn: Optional function formatting each document, applied in the same pass
+            which writes back the normalized scores
 
     Returns:
-        The same list of documents with normalized scores
+        The same list of documents with normalized scores, or the formatted documents if
+        `format_fn` is given
     """
     if not documents:
-        return documents
+        return [] if format_fn is not None else documents
+
+    scored = [doc for doc in documents if 'relevance_score' in doc.metadata]
+    if not scored:
+        return [format_fn(doc) for doc in documents] if format_fn is not None else documents
 
-    # Apply sigmoid normalization (1 / (1 + e^-x))
+    # Apply sigmoid normalization (1 / (1 + e^-x)) to all the scores at once
+    scores = np.fromiter((doc.metadata['relevance_score'] for doc in scored), dtype=np.float64, count=len(scored))
+    normalized_scores = iter((1 / (1 + np.exp(-scores * 0.1))).tolist())
+    formatted = []
     for doc in documents:
         if 'relevance_score' in doc.metadata:
-            original_score = doc.metadata['relevance_score']
-            scaled_score = original_score * 0.1
-            normalized_score = 1 / (1 + math.exp(-scaled_score))
-            doc.metadata['relevance_score'] = normalized_score
+            doc.metadata['relevance_score'] = next(normalized_scores)
+        if format_fn is not None:
+            formatted.append(format_fn(doc))
 
-    return documents
+    return formatted if format_fn is not None else documents
 
 async def check_service_health(
     url: str,
@@ -0,0 +1,295 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the request path helpers of src/chains.py."""
+import contextvars
+import threading
+from types import SimpleNamespace
+
+import orjson
+import pytest
+import requests
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+from langchain_nvidia_ai_endpoints import ChatNVIDIA
+
+from src import chains
+from src.semantic_cache import SemanticQueryCache
+
+QUERY = "which vgpu profile fits llama 3 8b"
+
+LLM_SETTINGS = {
+    "model": "meta/llama-3.1-8b-instruct",
+    "llm_endpoint": "nim-llm:8000",
+    "temperature": 0.2,
+    "top_p": 0.7,
+    "max_tokens": 1024,
+}
+
+RAG_SETTINGS = dict(
+    LLM_SETTINGS,
+    vdb_endpoint="http://milvus:19530",
+    enable_reranker=True,
+    embedding_model="nvidia/llama-3.2-nv-embedqa-1b-v2",
+    reranker_model="nvidia/llama-3.2-nv-rerankqa-1b-v2",
+)
+
+
+class ConstantEmbedder:
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+def _fail_to_get_llm(**kwargs):
+    raise RuntimeError("no llm is reachable from the tests")
+
+
+@pytest.fixture
+def query_cache(monkeypatch):
+    cache = SemanticQueryCache(ConstantEmbedder())
+    monkeypatch.setattr(chains, "query_cache", cache)
+    monkeypatch.setattr(chains, "retrieval_cache", None)
+    # Cache misses go on to the LLM, which fails the request instead
+    monkeypatch.setattr(chains, "get_llm", _fail_to_get_llm)
+    return cache
+
+
+@pytest.mark.parametrize("setting, value", [
+    ("model", "meta/llama-3.3-70b-instruct"),
+    ("llm_endpoint", "other-llm:8000"),
+    ("temperature", 0.9),
+    ("top_p", 1.0),
+    ("max_tokens", 128),
+])
+def test_llm_chain_responses_are_cached_per_sampling_setup(query_cache, setting, value):
+    query_cache.insert(QUERY, chains._response_cache_scope(**LLM_SETTINGS), "cached")
+    rag = chains.UnstructuredRAG()
+
+    assert list(rag.llm_chain(QUERY, [], **LLM_SETTINGS)) == ["cached"]
+    assert list(rag.llm_chain(QUERY, [], **dict(LLM_SETTINGS, **{setting: value}))) != ["cached"]
+
+
+@pytest.mark.parametrize("setting, value", [
+    ("temperature", 0.9),
+    ("vdb_endpoint", "http://other-milvus:19530"),
+    ("enable_reranker", False),
+    ("embedding_model", "nvidia/nv-embedqa-e5-v5"),
+    ("reranker_model", "nvidia/nv-rerankqa-mistral-4b-v3"),
+    ("vdb_top_k", 50),
+    ("reranker_top_k", 2),
+])
+def test_rag_chain_responses_are_cached_per_retrieval_and_sampling_setup(monkeypatch, query_cache, setting, value):
+    vectorstore = SimpleNamespace(col=SimpleNamespace(num_entities=10))
+    monkeypatch.setattr(chains, "get_embedding_model", lambda **kwargs: ConstantEmbedder())
+    monkeypatch.setattr(chains, "get_vectorstore", lambda *args: vectorstore)
+    monkeypatch.setattr(chains, "ENABLE_MULTITURN", False)
+    settings = dict(RAG_SETTINGS, vdb_top_k=20, reranker_top_k=4)
+    query_cache.insert(QUERY, chains._rag_response_cache_scope(**settings), "cached", context=["doc"],
+                       collection_name="docs")
+    rag = chains.UnstructuredRAG()
+
+    generator, context = rag.rag_chain(QUERY, [], collection_name="docs", **settings)
+    assert (list(generator), context) == (["cached"], ["doc"])
+    generator, context = rag.rag_chain(QUERY, [], collection_name="docs", **dict(settings, **{setting: value}))
+    assert list(generator) != ["cached"]
+
+
+def test_retrieval_cache_scope_covers_the_vector_database():
+    scope = chains._retrieval_cache_scope("search", 20, 4, **RAG_SETTINGS)
+
+    assert chains._retrieval_cache_scope("search", 20, 4, **RAG_SETTINGS) == scope
+    assert chains._retrieval_cache_scope("search", 20, 4, **dict(RAG_SETTINGS, vdb_endpoint="http://other-milvus:19530")) != scope
+    assert chains._retrieval_cache_scope("multiturn", 20, 4, **RAG_SETTINGS) != scope
+
+
+def test_streamed_structured_responses_end_with_the_parseable_final_response(monkeypatch):
+    description = "Use an L40S-24Q profile for llama 3 8b in FP16."
+
+    def stream_partials(prompts):
+        for _ in prompts:
+            pass
+        # The parser emits the defaults before the description starts streaming
+        yield chains.StructuredResponse()
+        for end in (9, 26, len(description)):
+            yield chains.StructuredResponse(description=description[:end])
+        yield chains.StructuredResponse(description=description, parameters={"vgpu_profile": "L40S-24Q"})
+
+    monkeypatch.setattr(chains, "query_cache", None)
+    monkeypatch.setattr(chains, "ENABLE_STRUCTURED_STREAMING", True)
+    monkeypatch.setattr(chains, "get_llm", lambda **kwargs: object())
+    monkeypatch.setattr(chains, "_get_structured_llm", lambda llm: RunnableGenerator(stream_partials))
+
+    accumulated, deltas = "", []
+    for chunk in chains.UnstructuredRAG().llm_chain(QUERY, [], **LLM_SETTINGS):
+        accumulated, delta = chains.accumulate_structured_chunk(accumulated, orjson.loads(chunk))
+        deltas.append(delta)
+
+    assert "".join(deltas[:-1]) == description
+    final = orjson.loads(accumulated)
+    assert final == orjson.loads(deltas[-1])
+    assert final["description"] == description
+    assert final["parameters"]["vgpu_profile"] == "L40S-24Q"
+
+
+def test_submitted_work_runs_on_the_retrieval_executor_in_the_callers_context():
+    request_id = contextvars.ContextVar("request_id")
+    request_id.set("request-1")
+
+    future = chains._submit(lambda: (request_id.get(), threading.current_thread().name))
+
+    value, thread_name = future.result(timeout=5)
+    assert value == "request-1"
+    assert thread_name.startswith("rag-retrieval")
+
+
+def test_rag_chain_retrieval_overlaps_prompt_construction(monkeypatch):
+    docs = [Document(page_content="An L40S-24Q profile fits llama 3 8b in FP16.")]
+    retrieval_threads, prompts = [], []
+
+    def retrieve(query):
+        retrieval_threads.append(threading.current_thread().name)
+        return docs
+
+    def answer(prompt):
+        prompts.append(prompt.to_string())
+        return chains.StructuredResponse(description="Use an L40S-24Q profile.",
+                                         parameters={"vgpu_profile": "L40S-24Q", "system_RAM": 32})
+
+    vectorstore = SimpleNamespace(as_retriever=lambda search_kwargs: RunnableLambda(retrieve))
+    for name, value in [("query_cache", None), ("ENABLE_MULTITURN", False), ("ENABLE_REFLECTION", False),
+                        ("ENABLE_RETRIEVER_BATCHING", False), ("ENABLE_STRUCTURED_STREAMING", False)]:
+        monkeypatch.setattr(chains, name, value)
+    monkeypatch.setattr(chains, "get_embedding_model", lambda **kwargs: ConstantEmbedder())
+    monkeypatch.setattr(chains, "get_vectorstore", lambda *args: vectorstore)
+    monkeypatch.setattr(chains, "get_ranking_model", lambda **kwargs: None)
+    monkeypatch.setattr(chains, "get_llm", lambda **kwargs: object())
+    monkeypatch.setattr(chains, "_get_structured_llm", lambda llm: RunnableLambda(answer))
+
+    generator, context = chains.UnstructuredRAG().rag_chain(
+        QUERY, [], reranker_top_k=4, vdb_top_k=20, collection_name="docs", **RAG_SETTINGS)
+
+    assert context == docs
+    assert orjson.loads(next(generator))["description"] == "Use an L40S-24Q profile."
+    assert len(retrieval_threads) == 1 and retrieval_threads[0].startswith("rag-retrieval")
+    assert docs[0].page_content in prompts[0]
+
+
+@pytest.mark.parametrize("enabled, count, skipped", [
+    (True, 3, True),
+    (True, 4, True),
+    (True, 5, False),
+    (False, 3, False),
+    (False, 4, False),
+    (True, 0, True),
+    (False, 0, True),
+])
+def test_reranking_is_skipped_within_reranker_top_k_only_when_enabled(monkeypatch, enabled, count, skipped):
+    monkeypatch.setattr(chains, "SKIP_RERANK_WITHIN_TOP_N", enabled)
+    docs = [Document(page_content=str(i)) for i in range(count)]
+
+    assert chains._skip_reranking(docs, reranker_top_k=4) is skipped
+
+
+@pytest.mark.parametrize("count, reranked", [(4, False), (5, True)])
+def test_retrieve_context_only_calls_the_reranker_when_it_narrows_the_documents(monkeypatch, count, reranked):
+    monkeypatch.setattr(chains, "SKIP_RERANK_WITHIN_TOP_N", True)
+    docs = [Document(page_content=str(i)) for i in range(count)]
+    rerank_calls = []
+
+    def rerank(inputs):
+        rerank_calls.append(len(inputs["context"]))
+        return {"context": inputs["context"][:4]}
+
+    monkeypatch.setattr(chains, "get_context_reranker", lambda: RunnableLambda(rerank))
+    context = chains.UnstructuredRAG()._retrieve_context(
+        RunnableLambda(lambda query: docs), object(), QUERY, top_k=20, reranker_top_k=4, normalize=False)
+
+    assert rerank_calls == ([count] if reranked else [])
+    assert context == docs[:4]
+
+
+def test_nim_llms_are_constrained_to_the_response_schema_with_guided_json():
+    llm = ChatNVIDIA(model="meta/llama-3.1-8b-instruct", base_url="http://nim-llm:8000/v1")
+
+    structured_llm = chains._get_structured_llm(llm)
+
+    assert chains._get_structured_llm(llm) is structured_llm
+    binding, parser = structured_llm.first, structured_llm.last
+    assert binding.bound is llm
+    assert binding.kwargs == {"nvext": {"guided_json": chains.StructuredResponse.model_json_schema()}}
+    response = parser.invoke('{"title": "generate_vgpu_config", "description": "Use L40S-24Q.", '
+                             '"parameters": {"vgpu_profile": "L40S-24Q"}}')
+    assert response == chains.StructuredResponse(description="Use L40S-24Q.", parameters={"vgpu_profile": "L40S-24Q"})
+
+
+def test_other_llms_use_langchain_structured_output():
+    class GuardrailsLLM:
+        def __init__(self):
+            self.schemas = []
+
+        def with_structured_output(self, schema):
+            self.schemas.append(schema)
+            return RunnableLambda(lambda prompt: chains.StructuredResponse())
+
+    llm = GuardrailsLLM()
+    structured_llm = chains._get_structured_llm(llm)
+
+    assert chains._get_structured_llm(llm) is structured_llm
+    assert llm.schemas == [chains.StructuredResponse]
+    assert chains._get_structured_llm(GuardrailsLLM()) is not structured_llm
+
+
+class StatusError(Exception):
+    """Client error carrying the HTTP status of its response, like the OpenAI client errors."""
+
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f"{status_code} Client Error", response=response)
+
+
+def _raised_from(cause):
+    try:
+        raise Exception("Model client request failed") from cause
+    except Exception as e:
+        return e
+
+
+def _raised_while_handling(context):
+    try:
+        try:
+            raise context
+        except Exception:
+            raise Exception("Model client request failed")
+    except Exception as e:
+        return e
+
+
+@pytest.mark.parametrize("status, key", [(401, "forbidden"), (403, "forbidden"), (404, "not_found"), (500, None)])
+@pytest.mark.parametrize("make_error", [StatusError, _http_error])
+@pytest.mark.parametrize("wrap", [lambda e: e, _raised_from, _raised_while_handling], ids=["e", "cause", "context"])
+def test_client_errors_are_classified_by_http_status(status, key, make_error, wrap):
+    assert chains._classify_error(wrap(make_error(status))) == key
+
+
+def test_client_errors_without_a_status_are_classified_by_message():
+    assert chains._classify_error(Exception("[403] Forbidden\nInvalid UAM response")) == "forbidden"
+    assert chains._classify_error(Exception("[404] Not Found\nmodel not found")) == "not_found"
+    assert chains._classify_error(Exception("[403] Forbidden")) is None
+    assert chains._classify_error(ValueError("invalid literal")) is None
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the ingestion embedding cache of src/embedding_cache.py."""
+import pytest
+
+from src.embedding_cache import EmbeddingCache
+
+
+class RecordingEmbedFn:
+    """Embeds a text as its length, recording the texts of every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "embeddings.sqlite")
+
+
+def test_missing_texts_are_embedded_once_and_returned_in_order(cache_path):
+    embed_fn = RecordingEmbedFn()
+    cache = EmbeddingCache(cache_path, "model")
+
+    vectors = cache.embed_documents(["aa", "b", "aa", "a  a", "ccc"], embed_fn)
+
+    assert embed_fn.calls == [["aa", "b", "a  a", "ccc"]]
+    assert vectors == [[2.0, 0.5], [1.0, 0.5], [2.0, 0.5], [4.0, 0.5], [3.0, 0.5]]
+
+
+def test_whitespace_variants_of_a_text_share_an_embedding(cache_path):
+    embed_fn = RecordingEmbedFn()
+    cache = EmbeddingCache(cache_path, "model")
+
+    assert cache.embed_documents(["some  text\n", " some text"], embed_fn) == [[11.0, 0.5], [11.0, 0.5]]
+    assert embed_fn.calls == [["some  text\n"]]
+
+
+def test_only_cache_misses_are_embedded(cache_path):
+    embed_fn = RecordingEmbedFn()
+    EmbeddingCache(cache_path, "model").embed_documents(["aa", "b"], embed_fn)
+
+    # A new cache on the same file, as after a restart, reuses the stored embeddings
+    cache = EmbeddingCache(cache_path, "model")
+    assert cache.embed_documents(["b", "ccc", "aa"], embed_fn) == [[1.0, 0.5], [3.0, 0.5], [2.0, 0.5]]
+    assert cache.embed_documents(["aa", "ccc"], embed_fn) == [[2.0, 0.5], [3.0, 0.5]]
+    assert embed_fn.calls == [["aa", "b"], ["ccc"]]
+
+
+def test_embeddings_are_cached_per_model(cache_path):
+    embed_fn = RecordingEmbedFn()
+    EmbeddingCache(cache_path, "model").embed_documents(["aa"], embed_fn)
+    EmbeddingCache(cache_path, "other-model").embed_documents(["aa"], embed_fn)
+
+    assert embed_fn.calls == [["aa"], ["aa"]]
+
+
+def test_a_failed_embedding_call_caches_nothing(cache_path):
+    def failing_embed_fn(texts):
+        raise ConnectionError("embedding service unavailable")
+
+    embed_fn = RecordingEmbedFn()
+    cache = EmbeddingCache(cache_path, "model")
+    with pytest.raises(ConnectionError):
+        cache.embed_documents(["aa"], failing_embed_fn)
+
+    assert cache.embed_documents(["aa"], embed_fn) == [[2.0, 0.5]]
+    assert embed_fn.calls == [["aa"]]
+
+
+def test_hits_and_misses_are_returned_at_the_same_precision(cache_path):
+    cache = EmbeddingCache(cache_path, "model")
+    embedding = [0.1, 1 / 3]
+
+    miss = cache.embed_documents(["aa"], lambda texts: [embedding])
+    hit = cache.embed_documents(["aa"], RecordingEmbedFn())
+
+    assert miss == hit
+    assert miss[0] == pytest.approx(embedding)
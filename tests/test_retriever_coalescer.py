@@ -0,0 +1,203 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the batched vector store searches of src/retriever_coalescer.py."""
+import threading
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from src import retriever_coalescer
+from src.retriever_coalescer import BatchingRetriever, get_batching_retriever
+
+
+class FakeEmbedder:
+    """Embeds a query as its length, recording the size of every embedding call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _embed(self, texts, model_type):
+        self.calls.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self._embed([text], model_type="query")[0]
+
+
+class FakeCollection:
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+
+    def search(self, data, limit, **kwargs):
+        self.vectorstore.search_calls.append(len(data))
+        return [self.vectorstore.hits(vector, limit) for vector in data]
+
+
+class FakeVectorStore:
+    """Dense vector store whose k-th hit for a vector [n] is the document 'n-k'."""
+
+    vector_fields = ["vector"]
+    _vector_field = "vector"
+    search_params = {}
+    enable_dynamic_field = True
+    fields = []
+    timeout = None
+
+    def __init__(self):
+        self.search_calls = []
+        self.col = FakeCollection(self)
+
+    @staticmethod
+    def hits(vector, k):
+        return [(Document(page_content=f"{int(vector[0])}-{i}"), 1.0) for i in range(k)]
+
+    @staticmethod
+    def _as_list(value):
+        return value if isinstance(value, list) else [value]
+
+    def _parse_documents_from_search_results(self, results):
+        return results[0]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        self.search_calls.append(1)
+        return self.hits(embedding, k)
+
+
+def _search_concurrently(retriever, queries):
+    results = {}
+    barrier = threading.Barrier(len(queries))
+
+    def search(query, k):
+        barrier.wait()
+        results[query] = [doc.page_content for doc in retriever.search(query, k)]
+
+    threads = [threading.Thread(target=search, args=(query, k)) for query, k in queries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize("version, search_calls", [("0.1.10", [3]), ("0.2.0", [1, 1, 1])])
+def test_batch_is_embedded_once_and_hits_fan_out(monkeypatch, version, search_calls):
+    monkeypatch.setattr(retriever_coalescer, "_langchain_milvus_version", lambda: version)
+    embedder, vectorstore = FakeEmbedder(), FakeVectorStore()
+    retriever = BatchingRetriever(vectorstore, embedder, flush_ms=200, max_batch=3)
+    try:
+        results = _search_concurrently(retriever, [("a", 1), ("bb", 2), ("ccc", 3)])
+    finally:
+        retriever.close()
+
+    assert embedder.calls == [3]
+    assert vectorstore.search_calls == search_calls
+    assert results == {"a": ["1-0"], "bb": ["2-0", "2-1"], "ccc": ["3-0", "3-1", "3-2"]}
+
+
+def test_hybrid_collections_are_not_batched():
+    vectorstore = SimpleNamespace(vector_fields=["dense", "sparse"])
+    assert get_batching_retriever(("hybrid",), vectorstore, FakeEmbedder()) is None
+    with pytest.raises(ValueError):
+        BatchingRetriever(vectorstore, FakeEmbedder())
+
+
+def test_close_stops_the_worker_and_rejects_new_searches():
+    retriever = BatchingRetriever(FakeVectorStore(), FakeEmbedder(), flush_ms=1)
+    assert [doc.page_content for doc in retriever.search("a", 1)] == ["1-0"]
+    retriever.close()
+
+    assert not retriever._worker.is_alive()
+    with pytest.raises(RuntimeError):
+        retriever.submit("a", 1)
+    retriever.close()
+
+
+def test_embedders_without_batched_query_embedding_embed_queries_one_by_one():
+    class QueryOnlyEmbedder:
+        def __init__(self):
+            self.queries = []
+
+        def embed_query(self, text):
+            self.queries.append(text)
+            return [float(len(text))]
+
+    embedder = QueryOnlyEmbedder()
+    assert retriever_coalescer._embed_queries(embedder, ["a", "bb"]) == [[1.0], [2.0]]
+    assert embedder.queries == ["a", "bb"]
+
+
+def test_requests_beyond_max_batch_are_split_and_results_fan_out():
+    embedder = FakeEmbedder()
+    batcher = retriever_coalescer.BatchingQueryEmbedder(embedder, flush_ms=200, max_batch=2)
+    try:
+        futures = [batcher.submit("x" * n) for n in range(1, 6)]
+        vectors = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+
+    assert embedder.calls == [2, 2, 1]
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+
+
+def test_a_failed_batch_fails_each_of_its_requests_only():
+    class FlakyEmbedder(FakeEmbedder):
+        def _embed(self, texts, model_type):
+            if "boom" in texts:
+                raise ConnectionError("embedding service unavailable")
+            return super()._embed(texts, model_type)
+
+    batcher = retriever_coalescer.BatchingQueryEmbedder(FlakyEmbedder(), flush_ms=200, max_batch=2)
+    try:
+        failed = [batcher.submit("a"), batcher.submit("boom")]
+        for future in failed:
+            with pytest.raises(ConnectionError):
+                future.result(timeout=5)
+        assert batcher.embed_query("bb") == [2.0]
+    finally:
+        batcher.close()
+
+
+@pytest.mark.parametrize("version", ["0.1.10", "0.2.0"])
+def test_a_failed_search_fails_each_search_of_its_batch(monkeypatch, version):
+    monkeypatch.setattr(retriever_coalescer, "_langchain_milvus_version", lambda: version)
+
+    class UnreachableVectorStore(FakeVectorStore):
+        @staticmethod
+        def hits(vector, k):
+            raise ConnectionError("milvus unavailable")
+
+    retriever = BatchingRetriever(UnreachableVectorStore(), FakeEmbedder(), flush_ms=200, max_batch=2)
+    try:
+        futures = [retriever.submit("a", 1), retriever.submit("bb", 2)]
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result(timeout=5)
+    finally:
+        retriever.close()
+
+
+def test_a_full_queue_rejects_new_requests_without_blocking():
+    batcher = retriever_coalescer.BatchingQueryEmbedder(FakeEmbedder(), flush_ms=1, max_queue=1)
+    queue = batcher._queue
+    # Keep the worker from draining the queue while it is full
+    batcher._queue = type(queue)(maxsize=1)
+    batcher._queue.put_nowait(object())
+    try:
+        with pytest.raises(RuntimeError):
+            batcher.submit("a")
+    finally:
+        batcher._queue = queue
+        batcher.close()
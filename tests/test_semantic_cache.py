@@ -0,0 +1,186 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the semantic response cache of src/semantic_cache.py."""
+import threading
+
+import numpy as np
+
+from src import semantic_cache
+from src.retriever_coalescer import BatchingQueryEmbedder
+from src.semantic_cache import SemanticQueryCache
+
+VECTORS = {
+    "what is a vgpu profile": [1.0, 0.0, 0.0],
+    "how much memory does llama need": [0.0, 1.0, 0.0],
+    "which gpu fits a 70b model": [0.0, 0.0, 1.0],
+}
+
+
+class FakeQueryEmbedder:
+    """Embeds the queries of VECTORS in batches, like NVIDIAEmbeddings, recording each batch size."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _embed(self, texts, model_type):
+        assert model_type == "query"
+        self.calls.append(len(texts))
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text):
+        return self._embed([text], model_type="query")[0]
+
+
+def test_concurrent_lookups_are_embedded_in_one_call():
+    embedder = FakeQueryEmbedder()
+    batcher = BatchingQueryEmbedder(embedder, flush_ms=200, max_batch=len(VECTORS))
+    cache = SemanticQueryCache(batcher)
+    barrier = threading.Barrier(len(VECTORS))
+    results = {}
+
+    def lookup(query):
+        barrier.wait()
+        results[query] = cache.lookup(query, "model")
+
+    threads = [threading.Thread(target=lookup, args=(query,)) for query in VECTORS]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        batcher.close()
+
+    assert embedder.calls == [len(VECTORS)]
+    assert results == {query: None for query in VECTORS}
+    # Each insert reuses the vector computed for its own lookup
+    for query in VECTORS:
+        cache.insert(query, "model", payload=query)
+    assert embedder.calls == [len(VECTORS)]
+    for entry in cache._entries.values():
+        np.testing.assert_array_equal(entry.vector, VECTORS[entry.response.payload])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class StaticEmbedder:
+    """Embeds the queries of VECTORS, and of `vectors`, one at a time."""
+
+    def __init__(self, vectors=None):
+        self.vectors = dict(VECTORS, **(vectors or {}))
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self.vectors[text]
+
+
+def test_similar_queries_hit_above_the_threshold_only():
+    embedder = StaticEmbedder({"what's a vgpu profile": [0.99, 0.14, 0.0], "vgpu memory": [0.7, 0.7, 0.0]})
+    cache = SemanticQueryCache(embedder, similarity_threshold=0.95)
+    cache.insert("what is a vgpu profile", "model", payload="profile")
+
+    assert cache.lookup("What is a  vGPU profile", "model").payload == "profile"
+    # Exact matches on the normalized query are served without embedding it
+    assert embedder.queries == ["what is a vgpu profile"]
+    assert cache.lookup("what's a vgpu profile", "model").payload == "profile"
+    assert cache.lookup("vgpu memory", "model") is None
+    assert cache.stats == {"hits": 2, "misses": 1, "evictions": 0, "size": 1}
+
+
+def test_entries_are_scoped_to_model_collection_and_history():
+    cache = SemanticQueryCache(StaticEmbedder())
+    query = "what is a vgpu profile"
+    cache.insert(query, "model", payload="answer", collection_name="docs", history=[("user", "hi")])
+
+    assert cache.lookup(query, "model", collection_name="docs", history=[("user", "hi")]).payload == "answer"
+    assert cache.lookup(query, "other-model", collection_name="docs", history=[("user", "hi")]) is None
+    assert cache.lookup(query, "model", collection_name="other", history=[("user", "hi")]) is None
+    assert cache.lookup(query, "model", collection_name="docs", history=[("user", "hello")]) is None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(semantic_cache, "time", clock)
+    cache = SemanticQueryCache(StaticEmbedder(), ttl_seconds=10)
+    cache.insert("what is a vgpu profile", "model", payload="answer")
+
+    clock.now = 9
+    assert cache.lookup("what is a vgpu profile", "model") is not None
+    clock.now = 11
+    assert cache.lookup("what is a vgpu profile", "model") is None
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["size"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SemanticQueryCache(StaticEmbedder(), max_entries=2)
+    first, second, third = VECTORS
+    cache.insert(first, "model", payload=first)
+    cache.insert(second, "model", payload=second)
+    assert cache.lookup(first, "model") is not None
+    cache.insert(third, "model", payload=third)
+
+    assert cache.lookup(second, "model") is None
+    assert cache.lookup(first, "model").payload == first
+    assert cache.lookup(third, "model").payload == third
+
+
+def test_invalidation_drops_entries_and_pending_inserts_of_the_collection():
+    cache = SemanticQueryCache(StaticEmbedder())
+    first, second, _ = VECTORS
+    cache.insert(first, "model", payload="stale", collection_name="docs")
+    cache.insert(first, "model", payload="kept", collection_name="other")
+    # A response generated while the collection changes must not be cached
+    assert cache.lookup(second, "model", collection_name="docs") is None
+    cache.invalidate("docs")
+    cache.insert(second, "model", payload="stale", collection_name="docs")
+
+    assert cache.lookup(first, "model", collection_name="docs") is None
+    assert cache.lookup(second, "model", collection_name="docs") is None
+    assert cache.lookup(first, "model", collection_name="other").payload == "kept"
+
+
+def test_a_changed_collection_version_invalidates_it():
+    cache = SemanticQueryCache(StaticEmbedder())
+    query = next(iter(VECTORS))
+    cache.sync_version("docs", 10)
+    cache.insert(query, "model", payload="answer", collection_name="docs")
+
+    cache.sync_version("docs", 10)
+    assert cache.lookup(query, "model", collection_name="docs") is not None
+    cache.sync_version("docs", 12)
+    assert cache.lookup(query, "model", collection_name="docs") is None
+
+
+def test_collection_versions_are_tracked_per_vector_database():
+    cache = SemanticQueryCache(StaticEmbedder())
+    query = next(iter(VECTORS))
+    cache.sync_version("docs", 10, vdb_endpoint="http://milvus-a:19530")
+    cache.sync_version("docs", 20, vdb_endpoint="http://milvus-b:19530")
+    cache.insert(query, "model", payload="answer", collection_name="docs")
+
+    # Alternating between two databases which share a collection name is not a change of either
+    cache.sync_version("docs", 10, vdb_endpoint="http://milvus-a:19530")
+    cache.sync_version("docs", 20, vdb_endpoint="http://milvus-b:19530")
+    assert cache.lookup(query, "model", collection_name="docs") is not None
+    cache.sync_version("docs", 21, vdb_endpoint="http://milvus-b:19530")
+    assert cache.lookup(query, "model", collection_name="docs") is None